@@ -5,4 +5,10 @@ from .models import *
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ['id', 'first_name', 'last_name', 'is_staff', 'phone']
-    list_display_links = ['id', 'first_name', 'last_name']
\ No newline at end of file
+    list_display_links = ['id', 'first_name', 'last_name']
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'phone', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['phone']
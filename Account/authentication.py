@@ -0,0 +1,141 @@
+"""
+Token authentication with an in-process cache.
+
+``CachedTokenAuthentication`` keeps the token and user rows it loaded in a
+small LRU, so an authenticated request normally runs no authentication
+query. Every entry is checked against a version token of its user in the
+default cache, shared between the workers in a multi-worker deploy, which ``signals.py`` bumps when the user is saved or deleted
+and when its token is deleted or created. Entries also expire after
+``AUTH_CACHE_TIMEOUT`` seconds. Inactive and soft deleted users fail
+authentication.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from Equeue.versions import bump, get_version
+
+from .models import User
+
+CACHE_SIZE = getattr(settings, 'AUTH_CACHE_SIZE', 10000)
+CACHE_TIMEOUT = getattr(settings, 'AUTH_CACHE_TIMEOUT', 5 * 60)
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+
+def _version_key(user_id):
+    return f'auth:version:{user_id}'
+
+
+def _rows(instance):
+    fields = instance._meta.concrete_fields
+    return [field.attname for field in fields], [getattr(instance, field.attname) for field in fields]
+
+
+def _lookup(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return entry
+
+
+def _discard(key, entry):
+    with _lock:
+        if _entries.get(key) is entry:
+            del _entries[key]
+
+
+def _build(entry):
+    # Fresh instances on every hit, so nothing a request does to request.user
+    # leaks into the next one
+    expires, user_id, version, token_row, user_row = entry
+    token = Token.from_db(DEFAULT_DB_ALIAS, *token_row)
+    token.user = User.from_db(DEFAULT_DB_ALIAS, *user_row)
+    return token.user, token
+
+
+def _store(token, version):
+    entry = (time.monotonic() + CACHE_TIMEOUT, token.user_id, version, _rows(token), _rows(token.user))
+    with _lock:
+        _entries[token.key] = entry
+        _entries.move_to_end(token.key)
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def get_cached(key):
+    """``(user, token)`` for the token ``key`` if it is cached and current, else ``None``."""
+    entry = _lookup(key)
+    if entry is None:
+        return None
+    expires, user_id, version, token_row, user_row = entry
+    if cache.get(_version_key(user_id)) != version:
+        _discard(key, entry)
+        return None
+    return _build(entry)
+
+
+def is_allowed(user):
+    return user.is_active and user.deleted_at is None
+
+
+def load(key):
+    """
+    ``(user, token)`` for the token ``key`` from the database, cached if the
+    user may log in. Raises ``Token.DoesNotExist``.
+
+    The user's version is taken before the rows are loaded, like
+    ``availability_cache.get_keys`` does: a rotation or deactivation that
+    commits in between bumps it, so the stale rows are never served. The
+    token's user is looked up first for that, a token never changes hands.
+    """
+    user_id = Token.objects.filter(key=key).values_list('user_id', flat=True).first()
+    if user_id is None:
+        raise Token.DoesNotExist
+    version = get_version(_version_key(user_id))
+    token = Token.objects.select_related('user').get(key=key)
+    if is_allowed(token.user):
+        _store(token, version)
+    return token.user, token
+
+
+def invalidate_user(user_id):
+    bump(_version_key(user_id))
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` that serves known tokens from the cache above."""
+
+    def authenticate_credentials(self, key):
+        cached = get_cached(key)
+        if cached is not None:
+            return cached
+
+        try:
+            user, token = load(key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not is_allowed(user):
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return user, token
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from Account import outbox, sms
+
+
+class Command(BaseCommand):
+    help = 'Send the due messages of the SMS outbox. Safe to run from cron next to the sender threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep running and send messages as they become due.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between checks with --loop.')
+
+    def handle(self, *args, **options):
+        gateway = sms.get_gateway()
+        while True:
+            sent = outbox.send_pending(gateway, options['batch_size'])
+            self.stdout.write(f"Took {sent} messages.")
+            if not options['loop']:
+                return
+            connection.close()
+            time.sleep(options['interval'])
@@ -1,10 +1,12 @@
 from django.db import models
+from django.utils import timezone
 from django.core.validators import RegexValidator
 from django.contrib.auth.models import AbstractUser
+from Equeue.tracking import DirtyFieldsMixin
 from .managers import UserManager
 
 
-class User(AbstractUser):    
+class User(DirtyFieldsMixin, AbstractUser):    
     username = None
     phone = models.CharField(
         unique=True,
@@ -31,4 +33,36 @@ class User(AbstractUser):
     class Meta:
         db_table = 'auth_user'
         verbose_name = 'Foydalanuvchi'
-        verbose_name_plural = 'Foydalanuvchilar'
\ No newline at end of file
+        verbose_name_plural = 'Foydalanuvchilar'
+
+class OutboundMessage(models.Model):
+    """
+    An SMS waiting in the outbox. Requests only insert these rows; the
+    sender in ``outbox.py`` hands them to the gateway afterwards.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+    phone = models.CharField(max_length=17)
+    body = models.TextField()
+    status = models.CharField(max_length=7, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Xabar'
+        verbose_name_plural = 'Xabarlar'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.phone}: {self.get_status_display()}"
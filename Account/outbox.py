@@ -0,0 +1,145 @@
+"""
+Outbound SMS.
+
+``enqueue`` only inserts an ``OutboundMessage``, so a request never waits
+for the gateway. ``manage.py send_sms`` hands due messages to the gateway
+in batches and retries failed ones with exponential backoff until
+``SMS_MAX_ATTEMPTS``. With ``SMS_SENDER_THREAD`` on, a commit that queued a
+message also wakes a sender thread in the web process, which picks up
+messages queued by other processes as well while it runs.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import sms
+from .models import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+SENDER_THREAD = getattr(settings, 'SMS_SENDER_THREAD', False)
+BATCH_SIZE = getattr(settings, 'SMS_BATCH_SIZE', 50)
+MAX_ATTEMPTS = getattr(settings, 'SMS_MAX_ATTEMPTS', 5)
+RETRY_DELAY = timedelta(seconds=getattr(settings, 'SMS_RETRY_SECONDS', 30))
+MAX_RETRY_DELAY = timedelta(hours=1)
+# A claimed batch whose sender died is sent again after this
+LEASE = timedelta(minutes=5)
+POLL_SECONDS = 60
+
+_wake = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue(phone, body):
+    message = OutboundMessage.objects.create(phone=phone, body=body)
+    if SENDER_THREAD:
+        transaction.on_commit(wake)
+    return message
+
+
+def send_confirmation_code(phone, confirmation_code):
+    return enqueue(phone, f'Your confirmation code: {confirmation_code}')
+
+
+def retry_delay(attempts):
+    # The exponent is capped so a large SMS_MAX_ATTEMPTS can not overflow timedelta
+    return min(RETRY_DELAY * 2 ** min(attempts - 1, 30), MAX_RETRY_DELAY)
+
+
+def claim(limit):
+    """
+    Take up to ``limit`` due messages by moving their next attempt past the
+    lease, so no other sender takes them meanwhile.
+    """
+    now = timezone.now()
+    due = OutboundMessage.objects.filter(status=OutboundMessage.PENDING, next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at').values_list('pk', flat=True)[:limit])
+    if not ids:
+        return []
+    lease_until = now + LEASE
+    due.filter(pk__in=ids).update(next_attempt_at=lease_until, attempts=F('attempts') + 1)
+    return list(OutboundMessage.objects.filter(pk__in=ids, next_attempt_at=lease_until))
+
+
+def send_due(gateway=None, limit=BATCH_SIZE):
+    """Send one batch of due messages and return how many were taken."""
+    messages = claim(limit)
+    if not messages:
+        return 0
+
+    gateway = gateway or sms.get_gateway()
+    try:
+        results = gateway.send_many([(message.phone, message.body) for message in messages])
+    except Exception as error:
+        results = [error] * len(messages)
+
+    now = timezone.now()
+    for message, error in zip(messages, results):
+        if error is None:
+            message.status = OutboundMessage.SENT
+            message.sent_at = now
+            message.last_error = ''
+            continue
+        message.last_error = f'{type(error).__name__}: {error}'
+        if message.attempts >= MAX_ATTEMPTS:
+            message.status = OutboundMessage.FAILED
+            logger.error('Giving up on message %s to %s: %s', message.pk, message.phone, message.last_error)
+        else:
+            message.next_attempt_at = now + retry_delay(message.attempts)
+            logger.warning('Could not send message %s to %s: %s', message.pk, message.phone, message.last_error)
+
+    OutboundMessage.objects.bulk_update(messages, ['status', 'sent_at', 'next_attempt_at', 'last_error'])
+    return len(messages)
+
+
+def send_pending(gateway=None, limit=BATCH_SIZE):
+    """Send batches until nothing is due, return the number of messages taken."""
+    gateway = gateway or sms.get_gateway()
+    total = 0
+    while True:
+        taken = send_due(gateway, limit)
+        total += taken
+        if taken < limit:
+            return total
+
+
+def seconds_until_due():
+    next_attempt_at = (
+        OutboundMessage.objects.filter(status=OutboundMessage.PENDING)
+        .order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+    )
+    if next_attempt_at is None:
+        return None
+    return max((next_attempt_at - timezone.now()).total_seconds(), 0)
+
+
+def _run():
+    gateway = sms.get_gateway()
+    while True:
+        _wake.clear()
+        timeout = POLL_SECONDS
+        try:
+            send_pending(gateway)
+            due = seconds_until_due()
+            if due is not None:
+                timeout = min(due, POLL_SECONDS)
+        except Exception:
+            logger.exception('Could not send outbound messages')
+        finally:
+            connection.close()
+        _wake.wait(timeout)
+
+
+def wake():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='sms-sender', daemon=True)
+            _worker.start()
+    _wake.set()
@@ -9,6 +9,7 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 
+from . import outbox
 from .models import *
 
 
@@ -61,9 +62,8 @@ class RegisterSerializer(serializers.ModelSerializer):
             is_active=False,
         )
         user.set_password(validated_data['password'])
-        user.save()
-        # Send confirmation_code via SMS here (integration with SMS gateway needed)
-        # send_sms(user.phone, confirmation_code)
+        user.save(update_fields=user.get_changed_fields())
+        outbox.send_confirmation_code(user.phone, confirmation_code)
         return user
 
 
@@ -93,7 +93,7 @@ class ConfirmSerializer(serializers.Serializer):
         user.is_active = True
         user.confirmation_code = None
         user.expiration_time = None
-        user.save()
+        user.save(update_fields=user.get_changed_fields())
         return user
 
 
@@ -118,9 +118,8 @@ class ResendConfirmationCodeSerializer(serializers.Serializer):
         expiration_time = timezone.now() + timedelta(minutes=1, seconds=30)
         user.confirmation_code = confirmation_code
         user.expiration_time = expiration_time
-        user.save()
-        # Send confirmation_code via SMS here (integration with SMS gateway needed)
-        # send_sms(user.phone, confirmation_code)
+        user.save(update_fields=user.get_changed_fields())
+        outbox.send_confirmation_code(user.phone, confirmation_code)
         return user
 
 
@@ -139,9 +138,9 @@ class UserSerializer(serializers.ModelSerializer):
             self.instance.confirmation_code = confirmation_code
             self.instance.expiration_time = timezone.now() + timedelta(minutes=1, seconds=30)
             self.instance.new_phone_temp = value
-            self.instance.save()
+            self.instance.save(update_fields=self.instance.get_changed_fields())
             # Send confirmation_code to the new phone number
-            # send_sms(value, confirmation_code)
+            outbox.send_confirmation_code(value, confirmation_code)
             self.context['confirmation_sent'] = True
         return value
 
@@ -152,7 +151,7 @@ class UserSerializer(serializers.ModelSerializer):
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        instance.save(update_fields=instance.get_changed_fields())
         return instance
 
 
@@ -178,7 +177,7 @@ class ConfirmPhoneSerializer(serializers.Serializer):
         
         user.confirmation_code = None
         user.expiration_time = None
-        user.save()
+        user.save(update_fields=user.get_changed_fields())
         
         # Update user's token
         Token.objects.filter(user=user).delete()
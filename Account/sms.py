@@ -0,0 +1,75 @@
+"""
+SMS gateways.
+
+``SMS_GATEWAY`` names the gateway class the outbox sender uses and has no
+default, so a deployment never writes confirmation codes somewhere it did
+not choose. A real provider subclasses ``BaseGateway`` and implements
+``send``, or ``send_many`` if the provider accepts several messages per
+call. The two stubs here deliver nothing, so everything runs offline.
+"""
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class GatewayError(Exception):
+    pass
+
+
+class BaseGateway:
+
+    def send(self, phone, body):
+        """Send one message, raise ``GatewayError`` (or anything else) on failure."""
+        raise NotImplementedError
+
+    def send_many(self, messages):
+        """
+        Send ``(phone, body)`` pairs. Returns one entry per message: ``None``
+        if it was sent, otherwise the exception it failed with.
+        """
+        results = []
+        for phone, body in messages:
+            try:
+                self.send(phone, body)
+            except Exception as error:
+                results.append(error)
+            else:
+                results.append(None)
+        return results
+
+
+class MemoryGateway(BaseGateway):
+    """Keeps sent messages in ``MemoryGateway.outbox``, like Django's locmem mail backend."""
+    outbox = []
+
+    def send(self, phone, body):
+        MemoryGateway.outbox.append((phone, body))
+
+
+class FileGateway(BaseGateway):
+    """Appends sent messages, codes included, to ``SMS_FILE_PATH``."""
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, 'SMS_FILE_PATH', None)
+        if not self.path:
+            raise ImproperlyConfigured('FileGateway needs SMS_FILE_PATH.')
+
+    def send_many(self, messages):
+        lines = [f'{timezone.now().isoformat()}\t{phone}\t{body}\n' for phone, body in messages]
+        with self._lock, open(self.path, 'a', encoding='utf-8') as file:
+            file.writelines(lines)
+        return [None] * len(lines)
+
+    def send(self, phone, body):
+        self.send_many([(phone, body)])
+
+
+def get_gateway():
+    path = getattr(settings, 'SMS_GATEWAY', None)
+    if not path:
+        raise ImproperlyConfigured('Set SMS_GATEWAY to the gateway class that sends SMS.')
+    return import_string(path)()
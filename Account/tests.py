@@ -1,3 +1,151 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import authentication, outbox, sms
+from .models import OutboundMessage, User
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone='998901234567', is_active=True)
+
+    def setUp(self):
+        cache.clear()
+        authentication.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_user(self):
+        return self.client.get('/account/user/')
+
+    def test_cache_hit_runs_no_query(self):
+        self.assertEqual(self.get_user().status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_user()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+    def test_rotated_token(self):
+        self.assertEqual(self.get_user().status_code, 200)
+        self.user.confirmation_code = '123456'
+        self.user.save()
+
+        response = self.client.post('/account/user/confirm/', {'confirmation_code': '123456'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_user().status_code, 401)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        self.assertEqual(self.get_user().status_code, 200)
+
+    def test_deactivated_user(self):
+        self.assertEqual(self.get_user().status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save(update_fields=user.get_changed_fields())
+        self.assertEqual(self.get_user().status_code, 401)
+
+    def test_soft_deleted_user(self):
+        self.assertEqual(self.get_user().status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        user.deleted_at = timezone.now()
+        user.save(update_fields=user.get_changed_fields())
+        self.assertEqual(self.get_user().status_code, 401)
+
+    def test_change_while_loading_is_not_cached(self):
+        # A deactivation committing between the token query and storing the
+        # rows must leave the entry stale
+        def deactivate_after_load(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if 'INNER JOIN "auth_user"' in sql:
+                authentication.invalidate_user(self.user.pk)
+            return result
+
+        with connection.execute_wrapper(deactivate_after_load):
+            authentication.load(self.token.key)
+        self.assertIsNone(authentication.get_cached(self.token.key))
+
+        authentication.load(self.token.key)
+        self.assertIsNotNone(authentication.get_cached(self.token.key))
+
+
+class FailingGateway(sms.BaseGateway):
+
+    def send(self, phone, body):
+        raise sms.GatewayError('unreachable')
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.message = outbox.enqueue('998901234567', 'Your confirmation code: 123456')
+        self.now = self.message.next_attempt_at
+        sms.MemoryGateway.outbox = []
+
+    def at(self, delay):
+        return mock.patch('django.utils.timezone.now', return_value=self.now + delay)
+
+    def refresh(self):
+        self.message.refresh_from_db()
+        return self.message
+
+    def test_send(self):
+        with self.at(timedelta(0)):
+            self.assertEqual(outbox.send_due(sms.MemoryGateway()), 1)
+        self.assertEqual(sms.MemoryGateway.outbox, [('998901234567', 'Your confirmation code: 123456')])
+        self.assertEqual(self.refresh().status, OutboundMessage.SENT)
+
+    def test_lease(self):
+        with self.at(timedelta(0)):
+            self.assertEqual([message.pk for message in outbox.claim(10)], [self.message.pk])
+        # Claimed by a sender that never reported back
+        with self.at(outbox.LEASE - timedelta(seconds=1)):
+            self.assertEqual(outbox.claim(10), [])
+        with self.at(outbox.LEASE):
+            self.assertEqual([message.attempts for message in outbox.claim(10)], [2])
+
+    def test_backoff(self):
+        self.assertEqual(outbox.retry_delay(1), outbox.RETRY_DELAY)
+        self.assertEqual(outbox.retry_delay(3), outbox.RETRY_DELAY * 4)
+        self.assertEqual(outbox.retry_delay(100), outbox.MAX_RETRY_DELAY)
+
+        with self.at(timedelta(0)), self.assertLogs('Account.outbox', 'WARNING'):
+            outbox.send_due(FailingGateway())
+        self.assertEqual(self.refresh().next_attempt_at, self.now + outbox.RETRY_DELAY)
+        self.assertEqual(self.message.last_error, 'GatewayError: unreachable')
+
+        with self.at(outbox.RETRY_DELAY - timedelta(seconds=1)):
+            self.assertEqual(outbox.send_due(FailingGateway()), 0)
+        with self.at(outbox.RETRY_DELAY), self.assertLogs('Account.outbox', 'WARNING'):
+            outbox.send_due(FailingGateway())
+        self.assertEqual(self.refresh().next_attempt_at, self.now + outbox.RETRY_DELAY * 3)
+        self.assertEqual(self.message.attempts, 2)
+
+    def test_max_attempts(self):
+        with self.assertLogs('Account.outbox', 'WARNING') as logs:
+            for attempt in range(outbox.MAX_ATTEMPTS):
+                self.assertEqual(self.refresh().status, OutboundMessage.PENDING)
+                with self.at(self.message.next_attempt_at - self.now):
+                    self.assertEqual(outbox.send_due(FailingGateway()), 1)
+        self.assertEqual(self.refresh().status, OutboundMessage.FAILED)
+        self.assertEqual(logs.records[-1].levelname, 'ERROR')
+        self.assertEqual(self.message.attempts, outbox.MAX_ATTEMPTS)
+
+        with self.at(outbox.MAX_RETRY_DELAY * 2):
+            self.assertEqual(outbox.send_due(FailingGateway()), 0)
+
+    @override_settings(SMS_GATEWAY=None)
+    def test_gateway_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            sms.get_gateway()
@@ -86,4 +86,9 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('user', 'business', 'employee', 'service', 'start_time', 'end_time')
         }),
     ]
-    
\ No newline at end of file
+    
+
+@admin.register(SlotHold)
+class SlotHoldAdmin(admin.ModelAdmin):
+    list_display = ['user', 'employee', 'service', 'start_time', 'end_time', 'expires_at']
+    raw_id_fields = ['user']
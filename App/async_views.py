@@ -0,0 +1,85 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from rest_framework import generics, response, status
+
+from . import availability, geo
+from .views import AvailableTimeMixin, BusinessListMixin, BusinessOrderListMixin, UserOrderListMixin
+
+
+class AsyncAPIView(generics.GenericAPIView):
+    """
+    ``GenericAPIView`` with an async ``dispatch`` and coroutine handlers, so
+    an ASGI worker never blocks on these endpoints.
+
+    Authentication, permissions, throttling and exception handling are
+    DRF's own, configured the same way as on the sync views. ``initial`` may
+    query, through the token cache or a permission's lookups, so it runs in
+    one ``sync_to_async`` call.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            # OPTIONS is answered by the sync APIView.options
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncBusinessListView(BusinessListMixin, AsyncAPIView):
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if 'lat' in request.query_params or 'lon' in request.query_params:
+            businesses = await geo.anearest(queryset, *self.get_nearby_params(request))
+            return self.nearby_response(businesses)
+
+        rows = [business async for business in self.paginator.page_queryset(queryset, request, self)]
+        serializer = self.get_serializer(self.paginator.paginate_rows(rows), many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class AsyncAvailableTimeView(AvailableTimeMixin, AsyncAPIView):
+
+    async def get(self, request, *args, **kwargs):
+        if self.is_range():
+            date_from, date_to = self.get_date_range()
+            employee, service = await self.aget_employee_and_service()
+            days = await availability.acalculate_available_times_range(employee, service, date_from, date_to)
+            return self.range_response(days)
+
+        date = self.get_date()
+        employee, service = await self.aget_employee_and_service()
+        return self.day_response(await availability.acalculate_available_times(employee, service, date))
+
+
+class AsyncOrderListView(UserOrderListMixin, AsyncAPIView):
+
+    async def get(self, request, *args, **kwargs):
+        orders = [order async for order in self.get_queryset()]
+        serializer = self.get_serializer(orders, many=True)
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AsyncBusinessOrdersListView(BusinessOrderListMixin, AsyncAPIView):
+
+    async def get(self, request, *args, **kwargs):
+        orders = [order async for order in self.get_queryset()]
+        serializer = self.get_serializer(orders, many=True)
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
@@ -0,0 +1,388 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from . import availability_cache
+from .utils import day_bounds
+from .models import EmployeeWorkSchedule, Order, SlotHold
+
+MAX_RANGE_DAYS = 31
+NEXT_AVAILABLE_WINDOW_DAYS = 7
+NEXT_AVAILABLE_HORIZON_DAYS = 90
+
+
+def get_workday(date):
+    return date.strftime('%a').upper()[:3]
+
+
+def get_expected_duration(employee, service):
+    return employee.duration if employee.duration else service.duration
+
+
+def merge_intervals(intervals):
+    """
+    Sort ``(start, end)`` pairs and merge the overlapping or touching ones,
+    so every busy moment of the day is covered by exactly one interval.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def free_intervals(date, schedules, busy, duration):
+    """
+    Cut every ``(start_time, end_time)`` schedule of ``date`` into slots of
+    ``duration`` and keep the ones that do not overlap ``busy``.
+
+    ``busy`` must come from ``merge_intervals``; a slot is taken when some
+    interval starts before the slot ends and ends after the slot starts.
+    """
+    tz = timezone.get_current_timezone()
+    starts = [interval[0] for interval in busy]
+    ends = [interval[1] for interval in busy]
+    slots = []
+
+    for schedule_start, schedule_end in schedules:
+        current_time = timezone.make_aware(datetime.combine(date, schedule_start), tz)
+        end_of_day = timezone.make_aware(datetime.combine(date, schedule_end), tz)
+        index = bisect_right(ends, current_time)
+
+        while current_time < end_of_day:
+            next_time = current_time + duration
+            while index < len(ends) and ends[index] <= current_time:
+                index += 1
+            if index == len(starts) or starts[index] >= next_time:
+                slots.append((current_time, next_time))
+            current_time = next_time
+
+    return slots
+
+
+def exclude_busy(slots, busy):
+    """Drop the ``slots`` that overlap the merged ``busy`` intervals."""
+    if not busy:
+        return slots
+    starts = [interval[0] for interval in busy]
+    ends = [interval[1] for interval in busy]
+    free = []
+    for start_time, end_time in slots:
+        index = bisect_right(ends, start_time)
+        if index == len(starts) or starts[index] >= end_time:
+            free.append((start_time, end_time))
+    return free
+
+
+def format_slots(slots):
+    return [
+        {
+            "start_time": start_time.strftime('%H:%M'),
+            "end_time": end_time.strftime('%H:%M'),
+        }
+        for start_time, end_time in slots
+    ]
+
+
+def fetch(steps):
+    """
+    Run ``steps``, a generator that yields querysets and is sent back their
+    rows, on the sync ORM and return its result.
+
+    The availability calculations are written as such generators, so the
+    sync and async views share them and differ only in how rows are read.
+    """
+    rows = None
+    try:
+        while True:
+            rows = list(steps.send(rows))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def afetch(steps):
+    """``fetch`` on the async ORM, one thread hop per yielded queryset."""
+    rows = None
+    try:
+        while True:
+            queryset = steps.send(rows)
+            rows = [row async for row in queryset]
+    except StopIteration as stop:
+        return stop.value
+
+
+def day_querysets(employee, date):
+    day_start, day_end = day_bounds(date)
+    schedules = EmployeeWorkSchedule.objects.filter(
+        employee=employee, workday=get_workday(date)
+    ).order_by('pk').values_list('start_time', 'end_time')
+    orders = Order.objects.filter(
+        employee=employee,
+        start_time__gte=day_start, start_time__lt=day_end,
+        end_time__gte=day_start, end_time__lt=day_end,
+    ).values_list('start_time', 'end_time')
+    return schedules, orders
+
+
+def available_times_steps(employee, service, date):
+    """
+    Steps of ``calculate_available_times`` for ``fetch``/``afetch``. The
+    cache calls stay synchronous like the rest of the cache layer.
+    """
+    duration = get_expected_duration(employee, service)
+    entry = (employee.pk, date, duration)
+    keys = availability_cache.get_keys([entry])
+    cached = availability_cache.get_many(keys)
+
+    if entry in cached:
+        slots = cached[entry]
+    else:
+        schedules, orders = day_querysets(employee, date)
+        schedules = yield schedules
+        busy = merge_intervals((yield orders))
+        slots = free_intervals(date, schedules, busy, duration)
+        availability_cache.set_many(keys, {entry: slots})
+
+    holds = group_holds((yield holds_queryset([employee.pk], date, date)))
+    return format_slots(exclude_busy(slots, holds.get((employee.pk, date))))
+
+
+def calculate_available_times(employee, service, date):
+    return fetch(available_times_steps(employee, service, date))
+
+
+async def acalculate_available_times(employee, service, date):
+    return await afetch(available_times_steps(employee, service, date))
+
+
+def iter_dates(date_from, date_to):
+    date = date_from
+    while date <= date_to:
+        yield date
+        date += timedelta(days=1)
+
+
+def load_schedules(employee_ids):
+    """
+    Load every work schedule of ``employee_ids`` as
+    ``{employee_id: {workday: [(start_time, end_time), ...]}}``.
+    """
+    return group_schedules(schedules_queryset(employee_ids))
+
+
+def schedules_queryset(employee_ids):
+    return EmployeeWorkSchedule.objects.filter(
+        employee_id__in=employee_ids
+    ).order_by('pk').values_list('employee_id', 'workday', 'start_time', 'end_time')
+
+
+def group_schedules(rows):
+    schedules = {}
+    for employee_id, workday, start_time, end_time in rows:
+        schedules.setdefault(employee_id, {}).setdefault(workday, []).append((start_time, end_time))
+    return schedules
+
+
+def load_orders(employee_ids, date_from, date_to):
+    """
+    Load the orders of ``employee_ids`` between ``date_from`` and ``date_to``
+    as merged busy intervals keyed by ``(employee_id, date)``, using the same
+    "starts and ends on that day" rule as ``day_querysets``.
+    """
+    return group_orders(orders_queryset(employee_ids, date_from, date_to))
+
+
+def orders_queryset(employee_ids, date_from, date_to):
+    range_start, range_end = day_bounds(date_from, date_to)
+    return Order.objects.filter(
+        employee_id__in=employee_ids, start_time__gte=range_start, start_time__lt=range_end
+    ).values_list('employee_id', 'start_time', 'end_time')
+
+
+def group_orders(rows):
+    orders = {}
+    for employee_id, start_time, end_time in rows:
+        date = timezone.localtime(start_time).date()
+        if timezone.localtime(end_time).date() == date:
+            orders.setdefault((employee_id, date), []).append((start_time, end_time))
+
+    return {key: merge_intervals(intervals) for key, intervals in orders.items()}
+
+
+def load_holds(employee_ids, date_from, date_to):
+    """
+    Load the active slot holds of ``employee_ids`` between ``date_from`` and
+    ``date_to`` as merged busy intervals keyed by ``(employee_id, date)``.
+
+    Holds expire on their own, so they are never part of the cached slot
+    maps and are subtracted from them on every read instead.
+    """
+    return group_holds(holds_queryset(employee_ids, date_from, date_to))
+
+
+def holds_queryset(employee_ids, date_from, date_to):
+    range_start, range_end = day_bounds(date_from, date_to)
+    return SlotHold.objects.filter(
+        employee_id__in=employee_ids, expires_at__gt=timezone.now(),
+        start_time__gte=range_start, start_time__lt=range_end
+    ).values_list('employee_id', 'start_time', 'end_time')
+
+
+def group_holds(rows):
+    holds = {}
+    for employee_id, start_time, end_time in rows:
+        holds.setdefault((employee_id, timezone.localtime(start_time).date()), []).append((start_time, end_time))
+    return {key: merge_intervals(intervals) for key, intervals in holds.items()}
+
+
+def available_times_range_steps(employee, service, date_from, date_to):
+    """Steps of ``calculate_available_times_range``, see ``available_times_steps``."""
+    duration = get_expected_duration(employee, service)
+    entries = [(employee.pk, date, duration) for date in iter_dates(date_from, date_to)]
+    keys = availability_cache.get_keys(entries)
+    slots = availability_cache.get_many(keys)
+
+    missing = [entry for entry in entries if entry not in slots]
+    if missing:
+        schedules = group_schedules((yield schedules_queryset([employee.pk]))).get(employee.pk, {})
+        orders = group_orders((yield orders_queryset([employee.pk], missing[0][1], missing[-1][1])))
+        computed = {
+            entry: free_intervals(entry[1], schedules.get(get_workday(entry[1]), []), orders.get(entry[:2], []), duration)
+            for entry in missing
+        }
+        availability_cache.set_many(keys, computed)
+        slots.update(computed)
+
+    holds = group_holds((yield holds_queryset([employee.pk], date_from, date_to)))
+    return [
+        {
+            "date": entry[1],
+            "slots": format_slots(exclude_busy(slots[entry], holds.get(entry[:2]))),
+        }
+        for entry in entries
+    ]
+
+
+def calculate_available_times_range(employee, service, date_from, date_to):
+    return fetch(available_times_range_steps(employee, service, date_from, date_to))
+
+
+async def acalculate_available_times_range(employee, service, date_from, date_to):
+    return await afetch(available_times_range_steps(employee, service, date_from, date_to))
+
+
+def load_day_for_employees(employee_ids, date):
+    schedules = {}
+    for employee_id, start_time, end_time in EmployeeWorkSchedule.objects.filter(
+        employee_id__in=employee_ids, workday=get_workday(date)
+    ).order_by('pk').values_list('employee_id', 'start_time', 'end_time'):
+        schedules.setdefault(employee_id, []).append((start_time, end_time))
+
+    day_start, day_end = day_bounds(date)
+    orders = {}
+    for employee_id, start_time, end_time in Order.objects.filter(
+        employee_id__in=employee_ids,
+        start_time__gte=day_start, start_time__lt=day_end,
+        end_time__gte=day_start, end_time__lt=day_end,
+    ).values_list('employee_id', 'start_time', 'end_time'):
+        orders.setdefault(employee_id, []).append((start_time, end_time))
+
+    return schedules, {employee_id: merge_intervals(intervals) for employee_id, intervals in orders.items()}
+
+
+def calculate_service_available_times(service, date):
+    """
+    Union of the free slots of every employee linked to ``service``; each
+    slot lists the ids of the employees that are free for it.
+    """
+    employees = list(service.employees.all())
+    entries = {employee: (employee.pk, date, get_expected_duration(employee, service)) for employee in employees}
+    keys = availability_cache.get_keys(list(entries.values()))
+    employee_slots = availability_cache.get_many(keys)
+
+    missing = [employee for employee, entry in entries.items() if entry not in employee_slots]
+    if missing:
+        schedules, busy = load_day_for_employees([employee.pk for employee in missing], date)
+        computed = {
+            entries[employee]: free_intervals(date, schedules.get(employee.pk, []), busy.get(employee.pk, []), entries[employee][2])
+            for employee in missing
+        }
+        availability_cache.set_many(keys, computed)
+        employee_slots.update(computed)
+
+    holds = load_holds([employee.pk for employee in employees], date, date)
+    slots = {}
+    for employee in employees:
+        for slot in exclude_busy(employee_slots[entries[employee]], holds.get((employee.pk, date))):
+            slots.setdefault(slot, []).append(employee.pk)
+
+    return [
+        {
+            "start_time": start_time.strftime('%H:%M'),
+            "end_time": end_time.strftime('%H:%M'),
+            "employees": employee_ids,
+        }
+        for (start_time, end_time), employee_ids in sorted(slots.items())
+    ]
+
+
+def find_next_available(employees, service, now=None):
+    """
+    Earliest free slot starting at or after ``now`` among ``employees``.
+
+    Work schedules are loaded once, so days on which nobody works are skipped
+    without a query. Orders and holds are fetched in windows that double in length,
+    starting with ``NEXT_AVAILABLE_WINDOW_DAYS``, until a slot fits or
+    ``NEXT_AVAILABLE_HORIZON_DAYS`` are scanned. Returns ``None`` when nothing
+    is free, otherwise the slot and the ids of the employees free for it.
+    """
+    now = timezone.localtime(now)
+    schedules = load_schedules([employee.pk for employee in employees])
+    employees = [employee for employee in employees if employee.pk in schedules]
+    if not employees:
+        return None
+
+    workdays = {workday for employee_schedules in schedules.values() for workday in employee_schedules}
+    last_date = now.date() + timedelta(days=NEXT_AVAILABLE_HORIZON_DAYS - 1)
+    window_start = now.date()
+    window_days = NEXT_AVAILABLE_WINDOW_DAYS
+
+    while window_start <= last_date:
+        window_end = min(window_start + timedelta(days=window_days - 1), last_date)
+        dates = [date for date in iter_dates(window_start, window_end) if get_workday(date) in workdays]
+
+        if dates:
+            employee_ids = [employee.pk for employee in employees]
+            busy = load_orders(employee_ids, dates[0], dates[-1])
+            for key, intervals in load_holds(employee_ids, dates[0], dates[-1]).items():
+                busy[key] = merge_intervals(busy.get(key, []) + intervals)
+            for date in dates:
+                workday = get_workday(date)
+                slots = {}
+                for employee in employees:
+                    employee_slots = free_intervals(
+                        date,
+                        schedules[employee.pk].get(workday, []),
+                        busy.get((employee.pk, date), []),
+                        get_expected_duration(employee, service),
+                    )
+                    for slot in employee_slots:
+                        if slot[0] >= now:
+                            slots.setdefault(slot, []).append(employee.pk)
+                if slots:
+                    start_time, end_time = min(slots)
+                    return {
+                        "date": date,
+                        "start_time": start_time.strftime('%H:%M'),
+                        "end_time": end_time.strftime('%H:%M'),
+                        "employees": slots[(start_time, end_time)],
+                    }
+
+        window_start = window_end + timedelta(days=1)
+        window_days *= 2
+
+    return None
@@ -0,0 +1,84 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from Equeue.versions import bump, get_versions
+
+CACHE_TIMEOUT = getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 60 * 60)
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _employee_version_key(employee_id):
+    return f'availability:version:{employee_id}'
+
+
+def _day_version_key(employee_id, date):
+    return f'availability:version:{employee_id}:{date.isoformat()}'
+
+
+def get_keys(entries):
+    """
+    Map every ``(employee_id, date, duration)`` entry to the cache key of its
+    free-slot map under the current employee and day versions.
+
+    Take the keys before loading from the database: a write that happens in
+    between changes the versions, so the computed slots land under a key
+    nobody reads anymore.
+    """
+    version_keys = set()
+    for employee_id, date, duration in entries:
+        version_keys.add(_employee_version_key(employee_id))
+        version_keys.add(_day_version_key(employee_id, date))
+    versions = get_versions(list(version_keys))
+
+    return {
+        (employee_id, date, duration): 'availability:slots:{}:{}:{}:{}:{}'.format(
+            employee_id,
+            date.isoformat(),
+            int(duration.total_seconds()),
+            versions[_employee_version_key(employee_id)],
+            versions[_day_version_key(employee_id, date)],
+        )
+        for employee_id, date, duration in entries
+    }
+
+
+def get_many(keys):
+    cached = cache.get_many(list(keys.values()))
+    found = {entry: cached[key] for entry, key in keys.items() if key in cached}
+    with _stats_lock:
+        _stats['hits'] += len(found)
+        _stats['misses'] += len(keys) - len(found)
+    return found
+
+
+def set_many(keys, slots):
+    cache.set_many({keys[entry]: value for entry, value in slots.items()}, CACHE_TIMEOUT)
+
+
+def invalidate_day(employee_id, date):
+    bump(_day_version_key(employee_id, date))
+
+
+def invalidate_employee(employee_id):
+    bump(_employee_version_key(employee_id))
+
+
+def get_stats():
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats['hits'] = 0
+        _stats['misses'] = 0
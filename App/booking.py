@@ -0,0 +1,103 @@
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .availability import get_expected_duration, get_workday, load_schedules
+from .models import Employee, Order, SlotHold
+from .signals import bulk_create
+
+NOT_IN_SCHEDULE = 'The order times must fall within the employee\'s work schedule for the selected day.'
+NOT_AVAILABLE = 'The employee is not available during the specified times.'
+
+
+def lock_employees(employee_ids):
+    """
+    Serialize bookings of the given employees until the current transaction
+    ends.
+
+    Backends with row locks take ``SELECT ... FOR UPDATE`` on the employee
+    rows, in primary key order so two bulk bookings can not deadlock. SQLite
+    has no row locks, so a no-op UPDATE takes its database write lock up
+    front instead, before the overlap check reads anything.
+    """
+    employees = Employee.objects.filter(pk__in=employee_ids)
+    if connection.features.has_select_for_update:
+        list(employees.select_for_update().order_by('pk').values_list('pk', flat=True))
+    else:
+        employees.update(duration=F('duration'))
+
+
+def lock_employee(employee_id):
+    lock_employees([employee_id])
+
+
+def _overlaps(intervals, start_time, end_time):
+    return any(start < end_time and end > start_time for start, end in intervals)
+
+
+def bulk_create_orders(business, items):
+    """
+    Validate ``items`` against the work schedules, the existing orders and
+    holds, and each other, then insert the valid ones with one
+    ``bulk_create``.
+
+    ``items`` are ``(index, data)`` pairs whose data holds ``user``,
+    ``employee`` and ``service`` instances and aware ``start_time``/
+    ``end_time``. Returns the created orders and a ``{index: errors}`` dict
+    for the rejected items.
+    """
+    errors = {}
+    employee_ids = sorted({data['employee'].pk for index, data in items})
+    if not employee_ids:
+        return [], errors
+
+    window_start = min(data['start_time'] for index, data in items)
+    window_end = max(data['end_time'] for index, data in items)
+
+    with transaction.atomic():
+        lock_employees(employee_ids)
+        schedules = load_schedules(employee_ids)
+
+        # One query each for the orders and holds of all locked employees
+        busy = {employee_id: [] for employee_id in employee_ids}
+        for employee_id, start, end in Order.objects.filter(
+            employee_id__in=employee_ids, start_time__lt=window_end, end_time__gt=window_start
+        ).values_list('employee_id', 'start_time', 'end_time'):
+            busy[employee_id].append((start, end))
+        holds = {employee_id: [] for employee_id in employee_ids}
+        for employee_id, user_id, start, end in SlotHold.objects.filter(
+            employee_id__in=employee_ids, start_time__lt=window_end, end_time__gt=window_start,
+            expires_at__gt=timezone.now(),
+        ).values_list('employee_id', 'user_id', 'start_time', 'end_time'):
+            holds[employee_id].append((user_id, start, end))
+
+        orders = []
+        for index, data in items:
+            employee = data['employee']
+            start_time = timezone.localtime(data['start_time'])
+            end_time = timezone.localtime(data['end_time'])
+
+            if end_time - start_time != get_expected_duration(employee, data['service']):
+                errors[index] = {'end_time': 'The duration between start_time and end_time must match the employee or service duration.'}
+                continue
+
+            employee_schedules = schedules.get(employee.pk, {}).get(get_workday(start_time), [])
+            if not any(start <= start_time.time() and end >= end_time.time() for start, end in employee_schedules):
+                errors[index] = {'start_time': NOT_IN_SCHEDULE, 'end_time': NOT_IN_SCHEDULE}
+                continue
+
+            # A user's own hold does not block their order
+            other_holds = [(start, end) for user_id, start, end in holds[employee.pk] if user_id != data['user'].pk]
+            if _overlaps(busy[employee.pk], start_time, end_time) or _overlaps(other_holds, start_time, end_time):
+                errors[index] = {'start_time': NOT_AVAILABLE, 'end_time': NOT_AVAILABLE}
+                continue
+
+            busy[employee.pk].append((start_time, end_time))
+            orders.append(Order(
+                user=data['user'], business=business, employee=employee, service=data['service'],
+                start_time=start_time, end_time=end_time,
+            ))
+
+        orders = bulk_create(Order, orders)
+
+    return orders, errors
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache':
+        return []
+    return [Warning(
+        'The default cache is a per-process LocMemCache.',
+        hint=(
+            'Availability, response and authentication version bumps reach only the process that '
+            'made them. Set CACHE_BACKEND and CACHE_LOCATION to a shared cache when running several workers.'
+        ),
+        id='App.W001',
+    )]
@@ -0,0 +1,66 @@
+"""
+Deferred file deletion.
+
+``delete`` queues a stored file for removal once the surrounding
+transaction commits; after a rollback the file is kept, like the row
+pointing at it. A single background thread removes queued files in
+batches, so deleting a business with all its images does no filesystem
+call inside the request.
+"""
+import logging
+import queue
+import threading
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='file-deletion', daemon=True)
+            _worker.start()
+
+
+def _run():
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for storage, name in batch:
+            try:
+                storage.delete(name)
+            except Exception:
+                logger.exception('Could not delete %s', name)
+            finally:
+                _queue.task_done()
+
+
+def delete(file):
+    """Delete the stored ``file`` (a ``FieldFile``) after the transaction commits."""
+    if not file:
+        return
+    storage, name = file.storage, file.name
+
+    def enqueue():
+        _ensure_worker()
+        _queue.put((storage, name))
+
+    transaction.on_commit(enqueue)
+
+
+def flush():
+    """Block until every queued file has been deleted."""
+    _queue.join()
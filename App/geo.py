@@ -0,0 +1,83 @@
+import heapq
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 50
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    ``Q`` on ``latitude``/``longitude`` that keeps every point within
+    ``radius_km`` of ``(lat, lon)`` plus some corners, so the
+    ``business_lat_lon_idx`` index can narrow the candidates before the
+    exact distance is computed.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    box = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+    # Near a pole every longitude can be within the radius
+    if min_lat <= -90 or max_lat >= 90:
+        return box
+
+    delta_lon = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    min_lon, max_lon = lon - delta_lon, lon + delta_lon
+    if min_lon < -180:
+        return box & (Q(longitude__gte=min_lon + 360) | Q(longitude__lte=max_lon))
+    if max_lon > 180:
+        return box & (Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon - 360))
+    return box & Q(longitude__gte=min_lon, longitude__lte=max_lon)
+
+
+def nearest(queryset, lat, lon, radius_km, limit):
+    """
+    The ``limit`` objects of ``queryset`` closest to ``(lat, lon)`` within
+    ``radius_km``, nearest first, each with a ``distance`` attribute in km.
+
+    Only ids and coordinates of the bounding box candidates are loaded; full
+    rows are fetched for the winners alone.
+    """
+    closest = closest_candidates(candidates(queryset, lat, lon, radius_km), lat, lon, radius_km, limit)
+    return with_distances(closest, queryset.in_bulk([pk for distance, pk in closest]))
+
+
+async def anearest(queryset, lat, lon, radius_km, limit):
+    """``nearest`` on the async ORM."""
+    rows = [row async for row in candidates(queryset, lat, lon, radius_km)]
+    closest = closest_candidates(rows, lat, lon, radius_km, limit)
+    return with_distances(closest, await queryset.ain_bulk([pk for distance, pk in closest]))
+
+
+def candidates(queryset, lat, lon, radius_km):
+    return (
+        queryset.filter(bounding_box(lat, lon, radius_km))
+        .prefetch_related(None)
+        .values_list('pk', 'latitude', 'longitude')
+    )
+
+
+def closest_candidates(rows, lat, lon, radius_km, limit):
+    distances = (
+        (haversine_km(lat, lon, latitude, longitude), pk)
+        for pk, latitude, longitude in rows
+    )
+    return heapq.nsmallest(limit, (item for item in distances if item[0] <= radius_km))
+
+
+def with_distances(closest, objects):
+    result = []
+    for distance, pk in closest:
+        obj = objects[pk]
+        obj.distance = distance
+        result.append(obj)
+    return result
@@ -0,0 +1,97 @@
+"""
+Thumbnail and medium variants of uploaded images.
+
+Uploads are stored as they are during the request. Once the transaction
+commits, ``schedule`` hands the resizing to a small thread pool, which
+writes the variants next to the original and records them on the row
+with an ``UPDATE`` that only applies if the original is still the same.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from . import response_cache
+from .models import *
+
+logger = logging.getLogger(__name__)
+
+SIZES = {
+    'thumbnail': (200, 200),
+    'medium': (800, 800),
+}
+# Source field and variant fields per model, in the order of SIZES
+FIELDS = {
+    Business: ('logo', 'logo_thumbnail', 'logo_medium'),
+    BusinessImage: ('image', 'thumbnail', 'medium'),
+    Employee: ('image', 'image_thumbnail', 'image_medium'),
+}
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+    thread_name_prefix='images',
+)
+
+
+def variant_files(instance):
+    source, *variants = FIELDS[type(instance)]
+    return [getattr(instance, field) for field in variants if getattr(instance, field)]
+
+
+def clear_variants(instance):
+    for field in FIELDS[type(instance)][1:]:
+        setattr(instance, field, None)
+
+
+def render(image, size):
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'png'
+    image.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+    return buffer.getvalue(), 'jpg'
+
+
+def process(model, pk, source_name):
+    source_field, *variant_fields = FIELDS[model]
+    saved = {}
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None or getattr(instance, source_field).name != source_name:
+            return
+
+        stem = os.path.splitext(os.path.basename(source_name))[0]
+        with getattr(instance, source_field).open('rb') as file, Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            for field_name, (variant, size) in zip(variant_fields, SIZES.items()):
+                content, extension = render(image, size)
+                field = model._meta.get_field(field_name)
+                name = field.generate_filename(instance, f'{stem}_{variant}.{extension}')
+                saved[field_name] = field.storage.save(name, ContentFile(content))
+
+        # The original may have been replaced while the variants were rendered
+        if model.objects.filter(pk=pk, **{source_field: source_name}).update(**saved):
+            response_cache.invalidate_business(pk if model is Business else instance.business_id)
+            saved = {}
+    except Exception:
+        logger.exception('Could not render image variants of %s %s', model.__name__, pk)
+    finally:
+        for field_name, name in saved.items():
+            model._meta.get_field(field_name).storage.delete(name)
+        connection.close()
+
+
+def schedule(instance):
+    """Render the variants of ``instance`` in the background once the transaction commits."""
+    source_name = getattr(instance, FIELDS[type(instance)][0]).name
+    if not source_name:
+        return
+    model, pk = type(instance), instance.pk
+    transaction.on_commit(lambda: _executor.submit(process, model, pk, source_name))
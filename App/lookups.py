@@ -0,0 +1,42 @@
+"""
+Request-scoped lookups of the objects named in the URL.
+
+Permissions, views and the serializer contexts they build all need the
+``Business`` of ``business_pk`` or the ``Employee`` of ``employee_pk``.
+These helpers load each of them once per request and keep it on the
+request, so the second and later callers cost no query. A missing row is
+remembered as ``None``; what that means is up to the caller.
+"""
+from .models import *
+
+
+def _memo(request):
+    try:
+        return request._lookups
+    except AttributeError:
+        request._lookups = {}
+        return request._lookups
+
+
+def get_business(request, business_pk):
+    memo = _memo(request)
+    key = (Business, int(business_pk))
+    if key not in memo:
+        memo[key] = Business.objects.filter(pk=business_pk).first()
+    return memo[key]
+
+
+def get_employee(request, employee_pk):
+    """The employee with its business, which is remembered as well."""
+    memo = _memo(request)
+    key = (Employee, int(employee_pk))
+    if key not in memo:
+        employee = Employee.objects.select_related('business').filter(pk=employee_pk).first()
+        memo[key] = employee
+        if employee is not None:
+            memo.setdefault((Business, employee.business_id), employee.business)
+    return memo[key]
+
+
+def is_creator(request, business):
+    return business is not None and business.creator_id == request.user.pk
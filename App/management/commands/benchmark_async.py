@@ -0,0 +1,101 @@
+import asyncio
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from App.management.fixtures import create_benchmark_fixture
+from App.models import Order
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests per second and latency of the sync DRF views with '
+        'their async counterparts under concurrent load, in process through '
+        'the WSGI and ASGI handlers. Needs a migrated, file-backed database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Requests per endpoint and mode.')
+        parser.add_argument('--concurrency', type=int, default=32)
+
+    def handle(self, *args, **options):
+        user, business, service, employee, date = create_benchmark_fixture()
+        token = Token.objects.create(user=user)
+        start_time = timezone.make_aware(datetime.combine(date, time(10)), timezone.get_current_timezone())
+        Order.objects.create(
+            user=user, business=business, employee=employee, service=service,
+            start_time=start_time, end_time=start_time + timedelta(minutes=30),
+        )
+        connection.close()
+
+        available = f'business/{business.pk}/service/{service.pk}/employee/{employee.pk}/evailabe/?date={date}'
+        endpoints = [
+            ('business', 'business/'),
+            ('available', available),
+            ('order', f'user/employee/{employee.pk}/order/?date={date}'),
+            ('business-order', f'business/employee/{employee.pk}/order/?date={date}'),
+        ]
+        headers = {'Authorization': f'Token {token.key}'}
+
+        try:
+            with override_settings(ALLOWED_HOSTS=['*']):
+                self.stdout.write(f"{'endpoint':<16}{'mode':<7}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+                for name, path in endpoints:
+                    for mode, run in (('sync', self.run_sync), ('async', self.run_async)):
+                        url = f'/app/{path}' if mode == 'sync' else f'/app/async/{path}'
+                        elapsed, latencies, errors = run(url, headers, options['requests'], options['concurrency'])
+                        self.stdout.write(
+                            f"{name:<16}{mode:<7}{len(latencies) / elapsed:>10.1f}"
+                            f"{percentile(latencies, 50) * 1000:>10.2f}{percentile(latencies, 99) * 1000:>10.2f}{errors:>8}"
+                        )
+        finally:
+            business.delete()
+            user.delete()
+
+    def run_sync(self, url, headers, requests, concurrency):
+        client = Client()
+
+        def request(_):
+            started = clock.perf_counter()
+            response = client.get(url, headers=headers)
+            return clock.perf_counter() - started, response.status_code
+
+        def close_connection(_):
+            connection.close()
+
+        started = clock.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(request, range(requests)))
+            list(executor.map(close_connection, range(concurrency)))
+        elapsed = clock.perf_counter() - started
+        return elapsed, [latency for latency, code in results], sum(1 for latency, code in results if code != 200)
+
+    def run_async(self, url, headers, requests, concurrency):
+        async def main():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def request():
+                async with semaphore:
+                    started = clock.perf_counter()
+                    response = await client.get(url, headers=headers)
+                    return clock.perf_counter() - started, response.status_code
+
+            started = clock.perf_counter()
+            results = await asyncio.gather(*(request() for _ in range(requests)))
+            return clock.perf_counter() - started, results
+
+        elapsed, results = asyncio.run(main())
+        return elapsed, [latency for latency, code in results], sum(1 for latency, code in results if code != 200)
@@ -0,0 +1,86 @@
+import random
+import threading
+import time as clock
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from App.management.fixtures import create_benchmark_fixture
+from App.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Book overlapping slots of one employee from many threads through '
+        'OrderListCreateView and check that no two orders overlap. '
+        'Needs a migrated, file-backed database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=25, help='Booking attempts per thread.')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated business and orders.')
+
+    def handle(self, *args, **options):
+        user, business, service, employee, date = create_benchmark_fixture()
+        url = f'/app/user/employee/{employee.pk}/order/'
+        # 30 minute orders starting every 15 minutes, so neighbours overlap
+        starts = [
+            timezone.make_aware(datetime.combine(date, time(9)), timezone.get_current_timezone()) + timedelta(minutes=15 * i)
+            for i in range(8 * 4 - 1)
+        ]
+        results = {'created': 0, 'rejected': 0, 'errors': 0}
+        results_lock = threading.Lock()
+        barrier = threading.Barrier(options['threads'])
+
+        def worker():
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                for _ in range(options['attempts']):
+                    start_time = timezone.localtime(random.choice(starts))
+                    try:
+                        res = client.post(url, {
+                            'service': service.pk,
+                            'start_time': start_time.strftime('%Y-%m-%d %H:%M'),
+                            'end_time': (start_time + timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M'),
+                        })
+                        outcome = {201: 'created', 400: 'rejected'}.get(res.status_code, 'errors')
+                    except Exception:
+                        outcome = 'errors'
+                    with results_lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = clock.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = clock.perf_counter() - started
+
+        orders = list(Order.objects.filter(employee=employee).order_by('start_time').values_list('start_time', 'end_time'))
+        double_bookings = sum(1 for previous, current in zip(orders, orders[1:]) if current[0] < previous[1])
+        attempts = options['threads'] * options['attempts']
+
+        self.stdout.write(f"backend:          {connection.vendor}")
+        self.stdout.write(f"attempts:         {attempts} ({options['threads']} threads)")
+        self.stdout.write(f"created:          {results['created']}")
+        self.stdout.write(f"rejected:         {results['rejected']}")
+        self.stdout.write(f"errors:           {results['errors']}")
+        self.stdout.write(f"elapsed:          {elapsed:.2f}s")
+        self.stdout.write(f"throughput:       {attempts / elapsed:.1f} requests/s")
+        if double_bookings:
+            self.stdout.write(self.style.ERROR(f"double bookings:  {double_bookings}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("double bookings:  0"))
+
+        if not options['keep']:
+            business.delete()
+            user.delete()
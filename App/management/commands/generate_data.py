@@ -0,0 +1,220 @@
+import random
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from Account.models import User
+from App.availability import get_workday
+from App.management.fixtures import placeholder_image
+from App.models import *
+
+WORKDAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT']
+DURATIONS = [timedelta(minutes=minutes) for minutes in (15, 30, 45, 60)]
+FIRST_NAMES = ['Aziz', 'Dilnoza', 'Javohir', 'Kamola', 'Sardor', 'Malika', 'Bekzod', 'Nilufar']
+LAST_NAMES = ['Karimov', 'Rahimova', 'Aliyev', 'Yusupova', 'Tursunov', 'Saidova', 'Ergashev', 'Nazarova']
+# Around Tashkent, so nearby searches have something to find
+LATITUDE = (41.20, 41.40)
+LONGITUDE = (69.10, 69.40)
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic business types, businesses with '
+        'service trees, employees with work schedules and orders, for '
+        'benchmarking. Rows are written with batched bulk_create, so no '
+        'signals run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', type=int, default=5, help='Business types.')
+        parser.add_argument('--businesses', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=5000, help='Customers placing the orders.')
+        parser.add_argument('--services', type=int, default=6, help='Top level services per business.')
+        parser.add_argument('--subservices', type=int, default=2, help='Subservices per top level service.')
+        parser.add_argument('--employees', type=int, default=4, help='Employees per business.')
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--days', type=int, default=60, help='Orders are spread over this many days around today.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        with transaction.atomic():
+            creators = self.create_users(options['businesses'], operator='90')
+            # The first creator is staff, so the benchmark can reach every endpoint
+            User.objects.filter(pk=creators[0].pk).update(is_staff=True)
+            customers = self.create_users(options['users'], operator='91')
+            types = self.create_types(options['types'], options['services'] * (options['subservices'] + 1))
+            businesses = self.create_businesses(creators, types)
+            services = self.create_services(businesses, types, options['services'], options['subservices'])
+            employees = self.create_employees(businesses, types, services, options['employees'])
+            schedules = self.create_schedules(employees)
+        self.create_orders(customers, employees, schedules, options['orders'], options['days'])
+
+    def log(self, message):
+        self.stdout.write(message)
+        self.stdout.flush()
+
+    def bulk_create(self, model, objects):
+        return model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def create_users(self, count, operator):
+        # Continue after the last generated number, so the command can be run repeatedly
+        last = User.objects.filter(phone__startswith=f'998{operator}').order_by('-phone').values_list('phone', flat=True).first()
+        first = int(last[5:]) + 1 if last else 0
+        users = self.bulk_create(User, [
+            User(phone=f'998{operator}{first + i:07d}', is_active=True)
+            for i in range(count)
+        ])
+        self.log(f'{len(users)} users')
+        return users
+
+    def create_types(self, count, names_per_type):
+        types = self.bulk_create(BusinessType, [BusinessType(name=f'Type {i + 1}') for i in range(count)])
+        service_names = self.bulk_create(ServiceName, [
+            ServiceName(business_type=business_type, name=f'{business_type.name} service {i + 1}')
+            for business_type in types
+            for i in range(names_per_type)
+        ])
+        roles = self.bulk_create(EmployeeRole, [
+            EmployeeRole(business_type=business_type, name=f'{business_type.name} role {i + 1}')
+            for business_type in types
+            for i in range(3)
+        ])
+        for business_type in types:
+            business_type.service_names = [name for name in service_names if name.business_type_id == business_type.pk]
+            business_type.roles = [role for role in roles if role.business_type_id == business_type.pk]
+        self.log(f'{len(types)} business types')
+        return types
+
+    def create_businesses(self, creators, types):
+        logo = placeholder_image('businesses/logos/generated.png')
+        businesses = self.bulk_create(Business, [
+            Business(
+                creator=creator,
+                business_type=self.random.choice(types),
+                name=f'Business {i + 1}',
+                description=f'Synthetic business {i + 1}',
+                logo=logo,
+                latitude=self.random.uniform(*LATITUDE),
+                longitude=self.random.uniform(*LONGITUDE),
+            )
+            for i, creator in enumerate(creators)
+        ])
+        self.log(f'{len(businesses)} businesses')
+        return businesses
+
+    def create_services(self, businesses, types, top_level, subservices):
+        types = {business_type.pk: business_type for business_type in types}
+        parents, children = [], []
+        for business in businesses:
+            names = iter(types[business.business_type_id].service_names)
+            for i in range(top_level):
+                parent = Service(business=business, service_name=next(names), duration=self.random.choice(DURATIONS))
+                parents.append(parent)
+                children.extend(
+                    Service(business=business, service_name=next(names), duration=self.random.choice(DURATIONS), parent=parent)
+                    for j in range(subservices)
+                )
+        # Parents first, so the children can point at their primary keys
+        self.bulk_create(Service, parents)
+        self.bulk_create(Service, children)
+        services = parents + children
+        self.log(f'{len(services)} services')
+        return services
+
+    def create_employees(self, businesses, types, services, per_business):
+        types = {business_type.pk: business_type for business_type in types}
+        employees = self.bulk_create(Employee, [
+            Employee(
+                business=business,
+                role=self.random.choice(types[business.business_type_id].roles),
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=self.random.choice(LAST_NAMES),
+                patronymic='',
+            )
+            for business in businesses
+            for i in range(per_business)
+        ])
+
+        by_business = {}
+        for service in services:
+            by_business.setdefault(service.business_id, []).append(service)
+        links = []
+        for employee in employees:
+            business_services = by_business[employee.business_id]
+            employee.services = self.random.sample(business_services, max(1, len(business_services) // 2))
+            links.extend(
+                Employee.service.through(employee_id=employee.pk, service_id=service.pk)
+                for service in employee.services
+            )
+        self.bulk_create(Employee.service.through, links)
+        self.log(f'{len(employees)} employees')
+        return employees
+
+    def create_schedules(self, employees):
+        schedules = {}
+        objects = []
+        for employee in employees:
+            start = time(self.random.choice([8, 9, 10]))
+            end = time(self.random.choice([17, 18, 19]))
+            days = self.random.sample(WORKDAYS, self.random.choice([5, 6]))
+            schedules[employee.pk] = {day: (start, end) for day in days}
+            objects.extend(
+                EmployeeWorkSchedule(employee=employee, workday=day, start_time=start, end_time=end)
+                for day in days
+            )
+        self.bulk_create(EmployeeWorkSchedule, objects)
+        self.log(f'{len(objects)} work schedules')
+        return schedules
+
+    def create_orders(self, customers, employees, schedules, count, days):
+        tz = timezone.get_current_timezone()
+        first_day = timezone.localdate() - timedelta(days=days // 2)
+        # Booked 15 minute steps per (employee, date), so orders never overlap
+        booked = {}
+        created = attempts = 0
+        batch = []
+
+        while created + len(batch) < count and attempts < count * 3:
+            attempts += 1
+            employee = self.random.choice(employees)
+            date = first_day + timedelta(days=self.random.randrange(days))
+            hours = schedules[employee.pk].get(get_workday(date))
+            if hours is None:
+                continue
+            service = self.random.choice(employee.services)
+            steps = int(service.duration.total_seconds() // 900)
+            day_steps = (hours[1].hour - hours[0].hour) * 4
+            first = self.random.randrange(day_steps - steps + 1)
+            taken = booked.setdefault((employee.pk, date), set())
+            wanted = set(range(first, first + steps))
+            if taken & wanted:
+                continue
+            taken |= wanted
+
+            start_time = timezone.make_aware(datetime.combine(date, hours[0]), tz) + timedelta(minutes=15 * first)
+            batch.append(Order(
+                user=self.random.choice(customers),
+                business_id=employee.business_id,
+                employee=employee,
+                service=service,
+                start_time=start_time,
+                end_time=start_time + service.duration,
+            ))
+            if len(batch) >= self.batch_size:
+                Order.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+                self.log(f'{created} orders')
+
+        if batch:
+            Order.objects.bulk_create(batch)
+            created += len(batch)
+        self.log(f'{created} orders')
+        if created < count:
+            self.log(self.style.WARNING(f'Schedules are full, created {created} of {count} orders.'))
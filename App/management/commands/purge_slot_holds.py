@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from App.models import SlotHold
+
+
+class Command(BaseCommand):
+    help = 'Delete expired slot holds. Uses the expires_at index, safe to run from cron.'
+
+    def handle(self, *args, **options):
+        deleted, _ = SlotHold.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(f"Deleted {deleted} expired slot holds.")
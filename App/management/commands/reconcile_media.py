@@ -0,0 +1,51 @@
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+
+
+class Command(BaseCommand):
+    help = (
+        'List files under MEDIA_ROOT that no FileField or ImageField row '
+        'refers to, for example left behind by a rolled back upload. '
+        'Only reports them unless --delete is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete the orphaned files.')
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Skip files modified less than this many seconds ago, they may belong to a running request.',
+        )
+
+    def handle(self, *args, **options):
+        referenced = self.referenced_names()
+        cutoff = time.time() - options['min_age']
+        orphans = []
+
+        for directory, dirnames, filenames in os.walk(settings.MEDIA_ROOT):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                if name not in referenced and os.path.getmtime(path) < cutoff:
+                    orphans.append(path)
+
+        for path in orphans:
+            self.stdout.write(path)
+            if options['delete']:
+                os.remove(path)
+
+        action = 'Deleted' if options['delete'] else 'Found'
+        self.stdout.write(f'{action} {len(orphans)} orphaned files, {len(referenced)} files are referenced.')
+
+    def referenced_names(self):
+        names = set()
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.FileField):
+                    values = model._default_manager.exclude(**{f'{field.name}__isnull': True}).exclude(**{field.name: ''})
+                    names.update(values.values_list(field.name, flat=True).iterator(chunk_size=5000))
+        return names
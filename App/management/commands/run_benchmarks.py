@@ -0,0 +1,280 @@
+import json
+import logging
+import statistics
+import time as clock
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from Account.models import User
+from App import availability, search
+from App.models import *
+from App.urls import urlpatterns
+from Equeue.instrumentation import fingerprint
+
+
+def summarize(values):
+    values = sorted(values)
+    if len(values) > 1:
+        cuts = statistics.quantiles(values, n=100, method='inclusive')
+        p50, p90, p95, p99 = cuts[49], cuts[89], cuts[94], cuts[98]
+    else:
+        p50 = p90 = p95 = p99 = values[0]
+    return {
+        'mean': round(statistics.fmean(values), 3),
+        'p50': round(p50, 3),
+        'p90': round(p90, 3),
+        'p95': round(p95, 3),
+        'p99': round(p99, 3),
+        'max': round(values[-1], 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every endpoint of App/urls.py through the Django test client '
+        'and write latency percentiles and query counts to a JSON file. Run '
+        'generate_data first. Requests that write run in a transaction that '
+        'is rolled back, so the database is left as it was.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Measured requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per endpoint.')
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--compare', help='Earlier results file to print the differences against.')
+        parser.add_argument('--endpoint', action='append', help='Only run this URL name. Can be repeated.')
+
+    def handle(self, *args, **options):
+        self.setup_targets()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        threshold = getattr(settings, 'QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        # Query counts are collected here, the per-request log lines would only drown the table
+        logging.getLogger('equeue.queries').setLevel(logging.ERROR)
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for pattern in urlpatterns:
+                name = pattern.name
+                if options['endpoint'] and name not in options['endpoint']:
+                    continue
+                request = getattr(self, f"request_{name.replace('-', '_')}", None)
+                if request is None:
+                    self.stderr.write(self.style.WARNING(f'{name}: no benchmark request defined, skipped'))
+                    continue
+
+                for i in range(options['warmup']):
+                    self.measure(request)
+                latencies, query_counts, statuses = [], [], Counter()
+                n_plus_one = 0
+                for i in range(options['iterations']):
+                    method, path, status_code, elapsed, queries = self.measure(request)
+                    latencies.append(elapsed * 1000)
+                    query_counts.append(len(queries))
+                    statuses[status_code] += 1
+                    shapes = Counter(fingerprint(query['sql']) for query in queries)
+                    if any(count > threshold for count in shapes.values()):
+                        n_plus_one += 1
+
+                results[name] = {
+                    'method': method,
+                    'path': path,
+                    'status': {str(code): count for code, count in sorted(statuses.items())},
+                    'latency_ms': summarize(latencies),
+                    'queries': {
+                        'min': min(query_counts),
+                        'max': max(query_counts),
+                        'mean': round(statistics.fmean(query_counts), 2),
+                    },
+                    'n_plus_one_requests': n_plus_one,
+                }
+                self.stdout.write(
+                    f"{name:<28}{method:<7}{results[name]['latency_ms']['p50']:>9.2f}{results[name]['latency_ms']['p95']:>9.2f}"
+                    f"{results[name]['queries']['max']:>5}  {results[name]['status']}"
+                )
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'rows': {
+                model.__name__: model.objects.count()
+                for model in (BusinessType, Business, Service, Employee, EmployeeWorkSchedule, Order)
+            },
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as file:
+            json.dump(report, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def setup_targets(self):
+        # generate_data makes the creator of the first business staff
+        self.user = User.objects.filter(is_staff=True, businesses__employees__service__isnull=False).first()
+        if self.user is None:
+            self.user = User.objects.filter(businesses__employees__service__isnull=False).first()
+        if self.user is None:
+            raise CommandError('No business with an employee and a service. Run generate_data first.')
+        self.token, created = Token.objects.get_or_create(user=self.user)
+        # Requests of the test client do not start the background build
+        search.build()
+
+        self.employee = Employee.objects.filter(business__creator=self.user, service__isnull=False).first()
+        self.business = self.employee.business
+        # Prefer a service with subservices, so the subservice list is not empty
+        services = self.employee.service.order_by('parent_id', 'pk')
+        self.service = services.filter(subservices__isnull=False).first() or services.first()
+
+        tomorrow = timezone.make_aware(
+            datetime.combine(timezone.localdate() + timedelta(days=1), time.min), timezone.get_current_timezone(),
+        )
+        slot = availability.find_next_available([self.employee], self.service, now=tomorrow)
+        if slot is None:
+            raise CommandError(f'Employee {self.employee.pk} has no free slot in the next {availability.NEXT_AVAILABLE_HORIZON_DAYS} days.')
+        self.date = slot['date']
+        self.start_time = f"{self.date} {slot['start_time']}"
+        self.end_time = f"{self.date} {slot['end_time']}"
+        self.stdout.write(
+            f'business {self.business.pk}, service {self.service.pk}, employee {self.employee.pk}, '
+            f'slot {self.start_time} - {slot["end_time"]}'
+        )
+        self.stdout.write(f"{'endpoint':<28}{'method':<7}{'p50 ms':>9}{'p95 ms':>9}{'qry':>5}  status")
+
+    def measure(self, request):
+        """
+        Run one request inside a transaction that is always rolled back.
+        Only the request itself is timed, not the setup of its rows.
+        """
+        with transaction.atomic():
+            try:
+                method, path, data = request()
+                with CaptureQueriesContext(connection) as queries:
+                    started = clock.perf_counter()
+                    if method == 'GET':
+                        response = self.client.get(path, data)
+                    else:
+                        response = self.client.generic(method, path, json.dumps(data), content_type='application/json')
+                    elapsed = clock.perf_counter() - started
+                return method, path, response.status_code, elapsed, queries.captured_queries
+            finally:
+                # Also when the request raises, which then propagates as is
+                transaction.set_rollback(True)
+
+    def url(self, name, **kwargs):
+        return reverse(name, kwargs=kwargs)
+
+    def create_hold(self):
+        start_time = timezone.make_aware(datetime.strptime(self.start_time, '%Y-%m-%d %H:%M'), timezone.get_current_timezone())
+        end_time = timezone.make_aware(datetime.strptime(self.end_time, '%Y-%m-%d %H:%M'), timezone.get_current_timezone())
+        return SlotHold.objects.create(
+            user=self.user, employee=self.employee, service=self.service,
+            start_time=start_time, end_time=end_time, expires_at=timezone.now() + timedelta(minutes=10),
+        )
+
+    def request_businesstype(self):
+        return 'GET', self.url('businesstype'), {}
+
+    def request_business(self):
+        return 'GET', self.url('business'), {'type_id': self.business.business_type_id}
+
+    def request_search(self):
+        # A typeahead prefix of the business name
+        return 'GET', self.url('search'), {'q': self.business.name[:5]}
+
+    def request_business_detail(self):
+        return 'GET', self.url('business-detail', business_pk=self.business.pk), {}
+
+    def request_service(self):
+        return 'GET', self.url('service', business_pk=self.business.pk), {}
+
+    def request_subservice(self):
+        return 'GET', self.url('subservice', business_pk=self.business.pk, service_pk=self.service.pk), {}
+
+    def request_service_available(self):
+        return 'GET', self.url('service-available', business_pk=self.business.pk, service_pk=self.service.pk), {'date': str(self.date)}
+
+    def request_service_next_available(self):
+        return 'GET', self.url('service-next-available', business_pk=self.business.pk, service_pk=self.service.pk), {}
+
+    def request_employee(self):
+        return 'GET', self.url('employee', business_pk=self.business.pk, service_pk=self.service.pk), {}
+
+    def request_employee_detail(self):
+        kwargs = {'business_pk': self.business.pk, 'service_pk': self.service.pk, 'employee_pk': self.employee.pk}
+        return 'GET', self.url('employee-detail', **kwargs), {}
+
+    def request_available(self):
+        kwargs = {'business_pk': self.business.pk, 'service_pk': self.service.pk, 'employee_pk': self.employee.pk}
+        return 'GET', self.url('available', **kwargs), {'date': str(self.date)}
+
+    def request_next_available(self):
+        kwargs = {'business_pk': self.business.pk, 'service_pk': self.service.pk, 'employee_pk': self.employee.pk}
+        return 'GET', self.url('next-available', **kwargs), {}
+
+    def request_business_order_bulk(self):
+        order = {
+            'employee': self.employee.pk,
+            'service': self.service.pk,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+        }
+        return 'POST', self.url('business-order-bulk', business_pk=self.business.pk), [order]
+
+    def request_business_order(self):
+        return 'GET', self.url('business-order', employee_pk=self.employee.pk), {'date': str(self.date)}
+
+    def request_order(self):
+        order = {'service': self.service.pk, 'start_time': self.start_time, 'end_time': self.end_time}
+        return 'POST', self.url('order', employee_pk=self.employee.pk), order
+
+    def request_hold(self):
+        hold = {'service': self.service.pk, 'start_time': self.start_time, 'end_time': self.end_time}
+        return 'POST', self.url('hold', employee_pk=self.employee.pk), hold
+
+    def request_hold_detail(self):
+        return 'GET', self.url('hold-detail', hold_pk=self.create_hold().pk), {}
+
+    def request_hold_confirm(self):
+        return 'POST', self.url('hold-confirm', hold_pk=self.create_hold().pk), {}
+
+    def request_async_business(self):
+        return 'GET', self.url('async-business'), {'type_id': self.business.business_type_id}
+
+    def request_async_available(self):
+        kwargs = {'business_pk': self.business.pk, 'service_pk': self.service.pk, 'employee_pk': self.employee.pk}
+        return 'GET', self.url('async-available', **kwargs), {'date': str(self.date)}
+
+    def request_async_business_order(self):
+        return 'GET', self.url('async-business-order', employee_pk=self.employee.pk), {'date': str(self.date)}
+
+    def request_async_order(self):
+        return 'GET', self.url('async-order', employee_pk=self.employee.pk), {'date': str(self.date)}
+
+    def request_availability_cache_stats(self):
+        return 'GET', self.url('availability-cache-stats'), {}
+
+    def compare(self, path, results):
+        with open(path) as file:
+            previous = json.load(file)['endpoints']
+        self.stdout.write(f"{'endpoint':<28}{'p50 ms':>18}{'p95 ms':>18}{'queries':>12}")
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            before, after = previous[name], result
+            self.stdout.write(
+                f"{name:<28}"
+                f"{before['latency_ms']['p50']:>8.2f} -> {after['latency_ms']['p50']:<6.2f}"
+                f"{before['latency_ms']['p95']:>8.2f} -> {after['latency_ms']['p95']:<6.2f}"
+                f"{before['queries']['max']:>5} -> {after['queries']['max']:<3}"
+            )
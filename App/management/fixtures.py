@@ -0,0 +1,43 @@
+import random
+from datetime import time, timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image
+
+from Account.models import User
+from App.availability import get_workday
+from App.models import *
+
+
+def placeholder_image(name, size=(400, 400)):
+    """Store a plain PNG under ``name`` unless it already exists and return its name."""
+    if not default_storage.exists(name):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 200, 200)).save(buffer, 'PNG')
+        name = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return name
+
+
+def create_benchmark_fixture(name='Benchmark'):
+    """
+    One business with a 30 minute service and one employee working
+    09:00-17:00 tomorrow. Delete the returned business and user to clean up.
+    """
+    suffix = random.randint(0, 9999999)
+    user = User.objects.create(phone=f'99890{suffix:07d}', is_active=True)
+    business_type, created = BusinessType.objects.get_or_create(name=name)
+    business = Business.objects.create(
+        creator=user, business_type=business_type, name=f'{name} {suffix}',
+        description='', logo=placeholder_image('businesses/logos/benchmark.png'), latitude=0, longitude=0,
+    )
+    service_name, created = ServiceName.objects.get_or_create(business_type=business_type, name=name)
+    service = Service.objects.create(business=business, service_name=service_name, duration=timedelta(minutes=30))
+    role, created = EmployeeRole.objects.get_or_create(business_type=business_type, name=name)
+    employee = Employee.objects.create(business=business, role=role, first_name=name, last_name=name, patronymic='')
+    employee.service.set([service])
+    date = timezone.localdate() + timedelta(days=1)
+    EmployeeWorkSchedule.objects.create(employee=employee, workday=get_workday(date), start_time=time(9), end_time=time(17))
+    return user, business, service, employee, date
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0019_business_lat_lon_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='logo_medium',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='businesses/logos/medium'),
+        ),
+        migrations.AddField(
+            model_name='business',
+            name='logo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='businesses/logos/thumbnails'),
+        ),
+        migrations.AddField(
+            model_name='businessimage',
+            name='medium',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='businesses/images/medium'),
+        ),
+        migrations.AddField(
+            model_name='businessimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='businesses/images/thumbnails'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='image_medium',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='employees/images/medium'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='employees/images/thumbnails'),
+        ),
+    ]
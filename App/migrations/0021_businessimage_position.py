@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('App', '0020_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='businessimage',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.AddField(
+            model_name='businessimage',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
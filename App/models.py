@@ -2,6 +2,7 @@ from django.db import models
 from django.utils.html import format_html
 from django.core.validators import RegexValidator
 from Account.models import User
+from Equeue.tracking import DirtyFieldsMixin
 
 class BusinessType(models.Model):
     name = models.CharField(max_length=100)
@@ -10,12 +11,14 @@ class BusinessType(models.Model):
         return self.name
 
 
-class Business(models.Model):
+class Business(DirtyFieldsMixin, models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='businesses')
     business_type = models.ForeignKey(BusinessType, on_delete=models.CASCADE, related_name='businesses') 
     name = models.CharField(max_length=100)
     description = models.TextField()
     logo = models.ImageField(upload_to='businesses/logos')
+    logo_thumbnail = models.ImageField(upload_to='businesses/logos/thumbnails', null=True, blank=True, editable=False)
+    logo_medium = models.ImageField(upload_to='businesses/logos/medium', null=True, blank=True, editable=False)
     latitude = models.FloatField()
     longitude = models.FloatField()
     
@@ -25,20 +28,30 @@ class Business(models.Model):
     class Meta:
         verbose_name = 'Business'
         verbose_name_plural = 'Businesses'
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='business_lat_lon_idx'),
+        ]
     
     def logo_tag(self):
         if self.logo:
-            return format_html('<img src="%s" style="max-width: 80px; max-height: 80px;" />' % self.logo.url)
+            logo = self.logo_thumbnail or self.logo
+            return format_html('<img src="%s" style="max-width: 80px; max-height: 80px;" />' % logo.url)
         return None
     logo_tag.short_description = 'Logo Tag'
     
 
-class BusinessImage(models.Model):
+class BusinessImage(DirtyFieldsMixin, models.Model):
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='businesses/images')
+    thumbnail = models.ImageField(upload_to='businesses/images/thumbnails', null=True, blank=True, editable=False)
+    medium = models.ImageField(upload_to='businesses/images/medium', null=True, blank=True, editable=False)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position', 'id']
     
     def image_tag(self):
-        return format_html('<img src="%s" width="100px" />' % (self.image.url))
+        return format_html('<img src="%s" width="100px" />' % ((self.thumbnail or self.image).url))
     image_tag.short_description = 'Image'
 
 
@@ -50,7 +63,7 @@ class ServiceName(models.Model):
         return self.name
 
 
-class Service(models.Model):
+class Service(DirtyFieldsMixin, models.Model):
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='services')
     service_name = models.ForeignKey(ServiceName, on_delete=models.CASCADE, related_name='services')
     duration = models.DurationField()
@@ -79,7 +92,7 @@ class EmployeeRole(models.Model):
         return self.name
 
 
-class Employee(models.Model):
+class Employee(DirtyFieldsMixin, models.Model):
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='employees')
     role = models.ForeignKey(EmployeeRole, on_delete=models.CASCADE, related_name='role')
     first_name = models.CharField(max_length=100)
@@ -88,6 +101,8 @@ class Employee(models.Model):
     duration = models.DurationField(null=True, blank=True)
     service = models.ManyToManyField(Service, related_name='employees')
     image = models.ImageField(upload_to='employees/images', null=True, blank=True)
+    image_thumbnail = models.ImageField(upload_to='employees/images/thumbnails', null=True, blank=True, editable=False)
+    image_medium = models.ImageField(upload_to='employees/images/medium', null=True, blank=True, editable=False)
     phone = models.CharField(
         null=True,
         blank=True,
@@ -105,7 +120,7 @@ class Employee(models.Model):
         return self.last_name + self.first_name
     
     def image_tag(self):
-        return format_html('<img src="%s" width="100px" />' % (self.image.url))
+        return format_html('<img src="%s" width="100px" />' % ((self.image_thumbnail or self.image).url))
     image_tag.short_description = 'Image'
 
 
@@ -130,7 +145,7 @@ class EmployeeWorkSchedule(models.Model):
 
 
 
-class Order(models.Model):
+class Order(DirtyFieldsMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='orders')
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='orders')
@@ -141,4 +156,27 @@ class Order(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.employee} ordered {self.service} from {self.start_time} to {self.end_time}"
\ No newline at end of file
+        return f"{self.employee} ordered {self.service} from {self.start_time} to {self.end_time}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['employee', 'start_time'], name='order_employee_start_idx'),
+            models.Index(fields=['user', 'employee', 'start_time'], name='order_user_employee_start_idx'),
+        ]
+
+class SlotHold(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slot_holds')
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='slot_holds')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='slot_holds')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.employee} held for {self.user} from {self.start_time} to {self.end_time}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['employee', 'start_time'], name='slothold_employee_start_idx'),
+        ]
@@ -0,0 +1,80 @@
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class BusinessCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key: every page is an indexed
+    ``id > cursor`` lookup, so deep pages cost as much as the first one.
+
+    ``paginate_queryset`` is split into ``page_queryset``, which only builds
+    the page query, and ``paginate_rows``, which turns its rows into the
+    page, so the async business list can read the rows with the async ORM.
+    """
+    ordering = 'id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_rows(list(self.page_queryset(queryset, request, view)))
+
+    def page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            order = self.ordering[0]
+            is_reversed = order.startswith('-')
+            order_attr = order.lstrip('-')
+            if self.cursor.reverse != is_reversed:
+                queryset = queryset.filter(**{order_attr + '__lt': current_position})
+            else:
+                queryset = queryset.filter(**{order_attr + '__gt': current_position})
+
+        # One extra row tells whether a following page exists
+        return queryset[offset:offset + self.page_size + 1]
+
+    def paginate_rows(self, rows):
+        offset, reverse, current_position = self.cursor or (0, False, None)
+        self.page = rows[:self.page_size]
+
+        if len(rows) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(rows[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
@@ -1,5 +1,6 @@
 from rest_framework import permissions
 from . models import *
+from .lookups import get_business, get_employee, is_creator
 
 
 class IsBusinessCreatorOrReadOnly(permissions.BasePermission):
@@ -13,20 +14,16 @@ class IsBusinessCreatorOrReadOnly(permissions.BasePermission):
         return self._is_creator(request, view)
     
     def _is_creator(self, request, view):
-        # Retrieve the business object
+        # Retrieve the business object, shared with the view
         business_pk = view.kwargs.get('business_pk')
         if business_pk:
-            try:
-                business = Business.objects.get(pk=business_pk)
-            except Business.DoesNotExist:
-                return False
-            return business.creator == request.user
+            return is_creator(request, get_business(request, business_pk))
         return False
 
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return obj.business.creator == request.user
+        return is_creator(request, obj.business)
 
 
 class IsBusinessCreator(permissions.BasePermission):
@@ -34,13 +31,9 @@ class IsBusinessCreator(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             employee_pk = view.kwargs.get('employee_pk')
             if employee_pk:
-                try:
-                    employee = Employee.objects.get(pk=employee_pk)
-                    business = employee.business
-                    return business.creator == request.user
-                except Employee.DoesNotExist:
-                    return False
+                employee = get_employee(request, employee_pk)
+                return employee is not None and is_creator(request, employee.business)
         return True
 
     def has_object_permission(self, request, view, obj):
-        return obj.business.creator == request.user
\ No newline at end of file
+        return is_creator(request, obj.business)
\ No newline at end of file
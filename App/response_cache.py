@@ -0,0 +1,97 @@
+"""
+Versioned response cache for the catalog endpoints.
+
+Cached responses are keyed by version tokens: one per business, bumped
+from ``signals.py`` whenever the business, its images, services, employees
+or their schedules change, and a global ``CATALOG`` one for business types,
+service names and employee roles, which every cached response depends on.
+Serving a cached response, or a 304 for a matching ``If-None-Match``,
+costs two cache lookups and no query.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+
+from Equeue import versions
+
+CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60)
+CATALOG = 'catalog'
+# Kept with the body and sent on cached responses and 304s as well
+STORED_HEADERS = ('Allow', 'Vary')
+
+
+def _version_key(scope):
+    return f'response:version:{scope}'
+
+
+def get_versions(scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    current = versions.get_versions(keys)
+    return [current[key] for key in keys]
+
+
+def invalidate_business(business_id):
+    versions.bump(_version_key(business_id))
+
+
+def invalidate_catalog():
+    versions.bump(_version_key(CATALOG))
+
+
+def matches(request, etag):
+    # Weak comparison, as RFC 9110 asks for If-None-Match
+    etags = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+    return '*' in etags or etag in etags
+
+
+class CachedResponseMixin:
+    """
+    Caches the rendered body of successful GET responses together with a
+    strong ETag, its MD5, and the ``STORED_HEADERS`` under the current
+    versions of ``get_cache_scopes``. Responses vary on ``Authorization``,
+    since the permissions decide whether a request gets the body at all.
+    """
+
+    def get_cache_scopes(self):
+        return [CATALOG, self.kwargs['business_pk']]
+
+    def get(self, request, *args, **kwargs):
+        versions = get_versions(self.get_cache_scopes())
+        # The body depends on the renderer and, through absolute media URLs, on the host
+        self.response_cache_key = 'response:body:{}'.format(hashlib.md5('|'.join(
+            versions + [request.accepted_renderer.format, request.build_absolute_uri()]
+        ).encode()).hexdigest())
+
+        cached = cache.get(self.response_cache_key)
+        if cached is None:
+            return super().get(request, *args, **kwargs)
+
+        etag, content, content_type, headers = cached
+        if matches(request, etag):
+            response = HttpResponseNotModified(headers=headers)
+        else:
+            response = HttpResponse(content, content_type=content_type, headers=headers)
+        response['ETag'] = etag
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method != 'GET':
+            return response
+        patch_vary_headers(response, ['Authorization'])
+        if not isinstance(response, Response) or response.status_code != 200:
+            return response
+
+        response.render()
+        etag = quote_etag(hashlib.md5(response.content).hexdigest())
+        headers = {header: value for header, value in response.items() if header in STORED_HEADERS}
+        cache.set(self.response_cache_key, (etag, response.content, response['Content-Type'], headers), CACHE_TIMEOUT)
+        if matches(request, etag):
+            response = HttpResponseNotModified(headers=headers)
+        response['ETag'] = etag
+        return response
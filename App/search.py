@@ -0,0 +1,323 @@
+"""
+In-process inverted index for business search.
+
+Every business is one document made of its name, description, the names
+of its services and the roles of its employees. Terms are kept in a sorted
+list, so a typeahead prefix expands to its terms with ``bisect`` instead
+of scanning the table with ``icontains``.
+
+The index is built in a background thread when the process serves its
+first request, and then kept up to date by the receivers in
+``signals.py`` once transactions commit. Searches never build it
+themselves: until the first build finishes they raise ``IndexNotReady``.
+Changes made by other processes are picked up by a full rebuild in the
+background every ``SEARCH_INDEX_REBUILD_SECONDS``; the old index keeps
+serving while it runs.
+
+A token matches every term it is a prefix of. Tokens of up to
+``SHORT_PREFIX`` characters expand to a large part of the index, so they
+are kept cheap:
+
+* a query made of one short token is answered from a top ``MAX_LIMIT``
+  list per prefix, computed on first use and dropped when a term with
+  that prefix is added or removed;
+* in a longer query, a short token other than the last one, which the
+  user is still typing, matches whole terms only;
+* tokens are applied fewest postings first, and once fewer businesses
+  are left than a token has postings, it is matched against the terms of
+  those businesses instead.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import *
+
+NAME_WEIGHT = 4.0
+SERVICE_WEIGHT = 2.0
+ROLE_WEIGHT = 1.5
+DESCRIPTION_WEIGHT = 1.0
+# A term that only starts with the query token scores less than an exact match
+PREFIX_FACTOR = 0.5
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+SHORT_PREFIX = 2
+REBUILD_SECONDS = getattr(settings, 'SEARCH_INDEX_REBUILD_SECONDS', 10 * 60)
+
+_TOKEN = re.compile(r'\w+')
+
+
+class IndexNotReady(Exception):
+    """The first build of the index in this process has not finished yet."""
+
+
+def tokenize(text):
+    return _TOKEN.findall(unicodedata.normalize('NFKC', text or '').casefold())
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}
+        self.terms = []
+        self.documents = {}
+        # {prefix: best (score, -business_id) pairs} of the short prefixes searched so far
+        self.top = {}
+        self.lock = threading.RLock()
+
+    def add(self, business_id, terms):
+        """Index ``business_id`` under ``terms``, a ``{term: weight}`` dict."""
+        with self.lock:
+            self.remove(business_id)
+            self.documents[business_id] = terms
+            for term, weight in terms.items():
+                self._drop_top(term)
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = {}
+                    insort(self.terms, term)
+                posting[business_id] = weight
+
+    def remove(self, business_id):
+        with self.lock:
+            for term in self.documents.pop(business_id, ()):
+                self._drop_top(term)
+                posting = self.postings[term]
+                del posting[business_id]
+                if not posting:
+                    del self.postings[term]
+                    del self.terms[bisect_left(self.terms, term)]
+
+    def _drop_top(self, term):
+        for length in range(1, SHORT_PREFIX + 1):
+            self.top.pop(term[:length], None)
+
+    def expand(self, token):
+        """All the terms starting with ``token``."""
+        # No character sorts after U+10FFFF, so the terms with the prefix end before it
+        return self.terms[bisect_left(self.terms, token):bisect_left(self.terms, token + '\U0010ffff')]
+
+    def match_terms(self, token, terms):
+        """``{business_id: score}`` of the businesses indexed under ``terms``."""
+        matches = {}
+        for term in terms:
+            factor = 1.0 if term == token else PREFIX_FACTOR
+            for business_id, weight in self.postings[term].items():
+                if weight * factor > matches.get(business_id, 0):
+                    matches[business_id] = weight * factor
+        return matches
+
+    def match_documents(self, token, business_ids, exact):
+        """``match_terms`` restricted to ``business_ids``, read from their own terms."""
+        matches = {}
+        for business_id in business_ids:
+            terms = self.documents[business_id]
+            if exact:
+                score = terms.get(token, 0)
+            else:
+                score = max((
+                    weight * (1.0 if term == token else PREFIX_FACTOR)
+                    for term, weight in terms.items() if term.startswith(token)
+                ), default=0)
+            if score:
+                matches[business_id] = score
+        return matches
+
+    def warm_top(self):
+        """Compute the top lists of every short prefix in the index."""
+        with self.lock:
+            prefixes = {term[:length] for term in self.terms for length in range(1, SHORT_PREFIX + 1)}
+            for prefix in prefixes:
+                self.get_top(prefix)
+
+    def get_top(self, prefix):
+        top = self.top.get(prefix)
+        if top is None:
+            matches = self.match_terms(prefix, self.expand(prefix))
+            top = self.top[prefix] = heapq.nlargest(
+                MAX_LIMIT, ((score, -business_id) for business_id, score in matches.items())
+            )
+        return top
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        ``(score, business_id)`` pairs of the best ``limit`` businesses
+        matching every token of ``query``, best first. Each token matches
+        the terms it is a prefix of, see the module docstring for short
+        tokens.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self.lock:
+            if len(tokens) == 1 and len(tokens[0]) <= SHORT_PREFIX:
+                best = self.get_top(tokens[0])[:limit]
+            else:
+                scores = self.score(tokens)
+                best = heapq.nlargest(limit, ((score, -business_id) for business_id, score in scores.items()))
+        return [(score, -business_id) for score, business_id in best]
+
+    def score(self, tokens):
+        lookups = []
+        for token in tokens:
+            exact = len(token) <= SHORT_PREFIX and token != tokens[-1]
+            if exact:
+                terms = [token] if token in self.postings else []
+            else:
+                terms = self.expand(token)
+            lookups.append((sum(len(self.postings[term]) for term in terms), token, terms, exact))
+        lookups.sort(key=lambda lookup: lookup[0])
+
+        scores = None
+        for postings, token, terms, exact in lookups:
+            if scores is None:
+                scores = self.match_terms(token, terms)
+            else:
+                if postings <= len(scores):
+                    matches = self.match_terms(token, terms)
+                else:
+                    matches = self.match_documents(token, scores, exact)
+                scores = {
+                    business_id: score + matches[business_id]
+                    for business_id, score in scores.items()
+                    if business_id in matches
+                }
+            if not scores:
+                return {}
+        return scores
+
+
+def load_documents(business_ids=None):
+    """``{business_id: {term: weight}}`` for all or the given businesses, in three queries."""
+    businesses = Business.objects.all()
+    services = Service.objects.all()
+    employees = Employee.objects.all()
+    if business_ids is not None:
+        businesses = businesses.filter(pk__in=business_ids)
+        services = services.filter(business_id__in=business_ids)
+        employees = employees.filter(business_id__in=business_ids)
+
+    documents = {}
+
+    def add(business_id, text, weight):
+        terms = documents.get(business_id)
+        if terms is None:
+            return
+        for term in tokenize(text):
+            if weight > terms.get(term, 0):
+                terms[term] = weight
+
+    for business_id, name, description in businesses.values_list('pk', 'name', 'description').iterator(chunk_size=5000):
+        documents[business_id] = {}
+        add(business_id, description, DESCRIPTION_WEIGHT)
+        add(business_id, name, NAME_WEIGHT)
+    for business_id, name in services.values_list('business_id', 'service_name__name').iterator(chunk_size=5000):
+        add(business_id, name, SERVICE_WEIGHT)
+    for business_id, name in employees.values_list('business_id', 'role__name').distinct().iterator(chunk_size=5000):
+        add(business_id, name, ROLE_WEIGHT)
+    return documents
+
+
+def build_index():
+    index = SearchIndex()
+    for business_id, terms in load_documents().items():
+        index.add(business_id, terms)
+    index.warm_top()
+    return index
+
+
+_index = None
+_built_at = 0.0
+_rebuilding = False
+# Businesses changed while a rebuild runs, replayed on the new index
+_pending = set()
+_state_lock = threading.Lock()
+
+
+def _start_rebuild():
+    global _rebuilding
+    _rebuilding = True
+    threading.Thread(target=_rebuild, name='search-index', daemon=True).start()
+
+
+def start_build():
+    """Build the index in the background unless it is built or being built."""
+    with _state_lock:
+        if _index is None and not _rebuilding:
+            _start_rebuild()
+
+
+def build():
+    """Build the index in the calling thread, for commands that search without serving requests."""
+    global _index, _built_at
+    index = build_index()
+    with _state_lock:
+        _index = index
+        _built_at = time.monotonic()
+
+
+def get_index():
+    with _state_lock:
+        if _index is None:
+            # Also retries a failed first build
+            if not _rebuilding:
+                _start_rebuild()
+            raise IndexNotReady
+        if not _rebuilding and time.monotonic() - _built_at > REBUILD_SECONDS:
+            _start_rebuild()
+        return _index
+
+
+def _rebuild():
+    global _index, _built_at, _rebuilding
+    try:
+        index = build_index()
+        with _state_lock:
+            _index = index
+            _rebuilding = False
+            pending = list(_pending)
+            _pending.clear()
+        if pending:
+            reindex(pending)
+    finally:
+        with _state_lock:
+            # Also after a failed build, so it is not retried on every search
+            _built_at = time.monotonic()
+            _rebuilding = False
+            _pending.clear()
+        connection.close()
+
+
+def reindex(business_ids):
+    """Reload the given businesses into the index, dropping deleted ones."""
+    with _state_lock:
+        index = _index
+        if _rebuilding:
+            _pending.update(business_ids)
+    # Not built in this process yet, the first build loads everything
+    if index is None:
+        return
+
+    documents = load_documents(business_ids)
+    for business_id in business_ids:
+        if business_id in documents:
+            index.add(business_id, documents[business_id])
+        else:
+            index.remove(business_id)
+
+
+def schedule_reindex(business_ids):
+    if _index is None and not _rebuilding:
+        return
+    business_ids = list(business_ids)
+    transaction.on_commit(lambda: reindex(business_ids))
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    return get_index().search(query, limit)
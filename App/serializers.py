@@ -1,8 +1,14 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.conf import settings
 from rest_framework import serializers
 from django.utils import timezone
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from .booking import lock_employee
 from .models import *
+from .signals import bulk_create
+
+SLOT_HOLD_DURATION = timedelta(minutes=getattr(settings, 'SLOT_HOLD_MINUTES', 5))
+
 
 class BusinessTypeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,7 +19,20 @@ class BusinessTypeSerializer(serializers.ModelSerializer):
 class BusinessImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = BusinessImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'thumbnail', 'medium', 'position']
+
+
+class ImageIdsField(serializers.ListField):
+    """
+    A list of image ids. Multipart form data cannot send an empty list, so
+    a single empty value, ``image_ids=``, stands for one.
+    """
+    child = serializers.IntegerField()
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and data == ['']:
+            return []
+        return super().to_internal_value(data)
 
 
 class BusinessSerializer(serializers.ModelSerializer):
@@ -26,11 +45,12 @@ class BusinessSerializer(serializers.ModelSerializer):
     image_files = serializers.ListField(
         child=serializers.ImageField(), write_only=True, required=False
     )
+    image_ids = ImageIdsField(write_only=True, required=False)
 
 
     class Meta:
         model = Business
-        fields = ['id', 'name', 'business_type', 'new_business_type', 'business_type_id', 'description', 'logo', 'latitude', 'longitude', 'images', 'image_files']
+        fields = ['id', 'name', 'business_type', 'new_business_type', 'business_type_id', 'description', 'logo', 'logo_thumbnail', 'logo_medium', 'latitude', 'longitude', 'images', 'image_files', 'image_ids']
         extra_kwargs = {
             'creator': {'write_only': True}
         }
@@ -67,26 +87,79 @@ class BusinessSerializer(serializers.ModelSerializer):
         validated_data.pop('new_business_type', None)
         
         business = super().create(validated_data)
-
-        for image_file in images_data:
-            BusinessImage.objects.create(business=business, image=image_file)
+        self.add_images(business, images_data, first_position=0)
         
         return business
 
+    def validate_image_ids(self, image_ids):
+        if len(set(image_ids)) != len(image_ids):
+            raise serializers.ValidationError("Image IDs must be unique.")
+        return image_ids
+
     def update(self, instance, validated_data):
+        """
+        ``image_ids`` lists the images to keep in their new order, the others
+        are deleted; without it every image is kept, an empty one deletes
+        them all. Files uploaded as
+        ``images`` are added after them. Only removed and added files touch
+        the disk.
+        """
         request = self.context.get('request')
         image_files = request.FILES.getlist('images')
-
-        instance = super().update(instance, validated_data)
-
-        instance.images.all().delete()
-        if image_files:
-            for image_file in image_files:
-                BusinessImage.objects.create(business=instance, image=image_file)
+        image_ids = validated_data.pop('image_ids', None)
+        validated_data.pop('image_files', None)
+
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+
+            existing = {image.pk: image for image in instance.images.all()}
+            if image_ids is None:
+                image_ids = list(existing)
+            unknown = set(image_ids) - set(existing)
+            if unknown:
+                raise serializers.ValidationError({"image_ids": f"Images {sorted(unknown)} do not belong to this business."})
+
+            removed = set(existing) - set(image_ids)
+            if removed:
+                # Deleted one by one through the signals, which remove their files
+                BusinessImage.objects.filter(pk__in=removed).delete()
+
+            moved = []
+            for position, image_id in enumerate(image_ids):
+                image = existing[image_id]
+                if image.position != position:
+                    image.position = position
+                    moved.append(image)
+            BusinessImage.objects.bulk_update(moved, ['position'])
+
+            self.add_images(instance, image_files, first_position=len(image_ids))
 
         return instance
+
+    def add_images(self, business, image_files, first_position):
+        bulk_create(BusinessImage, [
+            BusinessImage(business=business, image=image_file, position=first_position + i)
+            for i, image_file in enumerate(image_files)
+        ])
  
  
+class NearbyBusinessSerializer(BusinessSerializer):
+    distance = serializers.SerializerMethodField()
+
+    class Meta(BusinessSerializer.Meta):
+        fields = BusinessSerializer.Meta.fields + ['distance']
+
+    def get_distance(self, obj):
+        return round(obj.distance, 3)
+
+
+class SearchResultSerializer(BusinessSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(BusinessSerializer.Meta):
+        fields = BusinessSerializer.Meta.fields + ['score']
+
+
 class ServiceNameSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceName
@@ -141,6 +214,17 @@ class ServiceSerializer(serializers.ModelSerializer):
         return service
 
 
+class ServiceTreeSerializer(ServiceSerializer):
+    subservices = serializers.SerializerMethodField()
+
+    class Meta(ServiceSerializer.Meta):
+        fields = ServiceSerializer.Meta.fields + ['subservices']
+
+    def get_subservices(self, obj):
+        # Set by ServiceListCreateView.list_tree, no query per node
+        return ServiceTreeSerializer(obj.children, many=True).data
+
+
 class EmployeeRoleSerializer(serializers.ModelSerializer):
     class Meta:
         model = EmployeeRole
@@ -164,7 +248,7 @@ class EmployeeSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Employee
-        fields = ['id', 'role', 'role_id', 'new_role', 'first_name', 'last_name', 'patronymic', 'duration', 'service', 'image', 'phone', 'work_schedules']
+        fields = ['id', 'role', 'role_id', 'new_role', 'first_name', 'last_name', 'patronymic', 'duration', 'service', 'image', 'image_thumbnail', 'image_medium', 'phone', 'work_schedules']
     
     def validate(self, data):
         request = self.context.get('request')
@@ -198,12 +282,13 @@ class EmployeeSerializer(serializers.ModelSerializer):
         work_schedules_data = validated_data.pop('work_schedules')
         validated_data['business'] = business
         
-        employee = Employee.objects.create(**validated_data)
-        
-        for work_schedule_data in work_schedules_data:
-            EmployeeWorkSchedule.objects.create(employee=employee, **work_schedule_data)
-        
-        employee.service.set(service_data)
+        with transaction.atomic():
+            employee = Employee.objects.create(**validated_data)
+            bulk_create(EmployeeWorkSchedule, [
+                EmployeeWorkSchedule(employee=employee, **work_schedule_data)
+                for work_schedule_data in work_schedules_data
+            ])
+            employee.service.set(service_data)
         
         return employee
     
@@ -214,18 +299,50 @@ class EmployeeSerializer(serializers.ModelSerializer):
         service_data = validated_data.pop('service', None)
         validated_data.pop('new_role', None)
         
-        instance = super().update(instance, validated_data)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
 
-        if work_schedules_data:
-            instance.work_schedules.all().delete()
-            for work_schedule_data in work_schedules_data:
-                EmployeeWorkSchedule.objects.create(employee=instance, **work_schedule_data)
+            if work_schedules_data:
+                self.update_work_schedules(instance, work_schedules_data)
 
-        if service_data is not None:
-            instance.service.set(service_data)
+            if service_data is not None:
+                instance.service.set(service_data)
 
         return instance
 
+    def update_work_schedules(self, instance, work_schedules_data):
+        """
+        Make the stored schedules match ``work_schedules_data`` by
+        ``(workday, start_time, end_time)``, deleting and inserting only the
+        difference, in a constant number of queries.
+        """
+        wanted = {
+            (data['workday'], data['start_time'], data['end_time']): data
+            for data in work_schedules_data
+        }
+        kept = set()
+        stale = []
+        for schedule in instance.work_schedules.all():
+            key = (schedule.workday, schedule.start_time, schedule.end_time)
+            # Duplicates of a kept schedule go as well
+            if key in wanted and key not in kept:
+                kept.add(key)
+            else:
+                stale.append(schedule.pk)
+
+        if stale:
+            # Through the related manager, so the delete receivers find the
+            # employee cached instead of querying it per row
+            instance.work_schedules.filter(pk__in=stale).delete()
+
+        added = [
+            EmployeeWorkSchedule(employee=instance, **data)
+            for key, data in wanted.items()
+            if key not in kept
+        ]
+        if added:
+            bulk_create(EmployeeWorkSchedule, added)
+
 
 class OrderSerializer(serializers.ModelSerializer):
     created_at = serializers.SerializerMethodField()
@@ -287,13 +404,7 @@ class OrderSerializer(serializers.ModelSerializer):
                 'end_time': 'The order times must fall within the employee\'s work schedule for the selected day.'
             })
 
-        # Check if the employee is available during the specified times
-        if not self.is_employee_available(employee, start_time, end_time):
-            raise serializers.ValidationError({
-                'start_time': 'The employee is not available during the specified times.',
-                'end_time': 'The employee is not available during the specified times.'
-            })
-
+        # The overlap check runs in create(), under the employee lock
         return data
 
     def employee_works_on_day_and_time(self, employee, start_time, end_time):
@@ -305,24 +416,103 @@ class OrderSerializer(serializers.ModelSerializer):
         return False
 
     def is_employee_available(self, employee, start_time, end_time):
-        return not Order.objects.filter(
+        if Order.objects.filter(
             employee=employee,
             start_time__lt=end_time,
             end_time__gt=start_time
-        ).exists()
+        ).exists():
+            return False
+        # Slots held by other users count as busy until their hold expires
+        return not SlotHold.objects.filter(
+            employee=employee,
+            start_time__lt=end_time,
+            end_time__gt=start_time,
+            expires_at__gt=timezone.now(),
+        ).exclude(user=self.context.get('user')).exists()
     
     def create(self, validated_data):
         business = self.context.get('business')
         employee = self.context.get('employee')
         user = self.context.get('user')
-    
-        order = Order.objects.create(
-            user=user, business=business, employee=employee, **validated_data
-        )
+
+        with transaction.atomic():
+            lock_employee(employee.pk)
+
+            # Check if the employee is available during the specified times
+            if not self.is_employee_available(employee, validated_data['start_time'], validated_data['end_time']):
+                raise serializers.ValidationError({
+                    'start_time': 'The employee is not available during the specified times.',
+                    'end_time': 'The employee is not available during the specified times.'
+                })
+
+            order = Order.objects.create(
+                user=user, business=business, employee=employee, **validated_data
+            )
         return order
 
 
+class BulkOrderItemSerializer(serializers.Serializer):
+    # The customer the order is for, the business creator by default
+    user = serializers.IntegerField(required=False)
+    employee = serializers.IntegerField()
+    service = serializers.IntegerField()
+    start_time = serializers.DateTimeField(input_formats=['%Y-%m-%d %H:%M'])
+    end_time = serializers.DateTimeField(input_formats=['%Y-%m-%d %H:%M'])
+
+
+class SlotHoldSerializer(OrderSerializer):
+    created_at = None
+
+    class Meta:
+        model = SlotHold
+        fields = ['id', 'user', 'employee', 'service', 'start_time', 'end_time', 'expires_at']
+        read_only_fields = ['user', 'employee', 'expires_at']
+
+    def create(self, validated_data):
+        employee = self.context.get('employee')
+        user = self.context.get('user')
+        now = timezone.now()
+
+        with transaction.atomic():
+            lock_employee(employee.pk)
+
+            # Expired holds are never read again. Only this employee's, the
+            # lock covers no other employee's rows
+            SlotHold.objects.filter(employee=employee, expires_at__lte=now).delete()
+            # A user re-picking a slot replaces the previous hold
+            SlotHold.objects.filter(user=user, employee=employee).delete()
+
+            if not self.is_employee_available(employee, validated_data['start_time'], validated_data['end_time']):
+                raise serializers.ValidationError({
+                    'start_time': 'The employee is not available during the specified times.',
+                    'end_time': 'The employee is not available during the specified times.'
+                })
+
+            hold = SlotHold.objects.create(
+                user=user, employee=employee, expires_at=now + SLOT_HOLD_DURATION, **validated_data
+            )
+        return hold
+
+    def to_representation(self, instance):
+        ret = super().to_representation(instance)
+        ret['expires_at'] = timezone.localtime(instance.expires_at).strftime('%Y-%m-%d %H:%M:%S')
+        return ret
+
+
 class AvailableTimeSerializer(serializers.Serializer):
     start_time = serializers.DateTimeField()
     end_time = serializers.DateTimeField()
 
+
+
+class AvailableDaySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    slots = AvailableTimeSerializer(many=True)
+
+
+class ServiceAvailableTimeSerializer(AvailableTimeSerializer):
+    employees = serializers.ListField(child=serializers.IntegerField())
+
+
+class NextAvailableTimeSerializer(ServiceAvailableTimeSerializer):
+    date = serializers.DateField()
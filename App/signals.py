@@ -1,57 +1,262 @@
-import os
-from django.db.models.signals import post_delete, pre_save
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
+from . import availability_cache, file_deletion, images, response_cache, search
 from .models import *
 
-def delete_image(image_path):
-    if os.path.isfile(image_path):
-        os.remove(image_path)
+def get_old_instance(instance):
+    """
+    The row as stored before this save. Taken from the instance's loaded
+    snapshot, so only instances that were not loaded from the database
+    cost a query. ``None`` if the row does not exist.
+    """
+    old_instance = instance.get_loaded_instance()
+    if old_instance is None:
+        old_instance = type(instance)._default_manager.filter(pk=instance.pk).first()
+    return old_instance
+
+
+def delete_variants(instance):
+    for variant in images.variant_files(instance):
+        file_deletion.delete(variant)
+
+
+def replace_variants(instance, old_instance):
+    # The variants are rendered again for the new original after commit
+    instance._image_changed = True
+    delete_variants(old_instance)
+    images.clear_variants(instance)
+
 
 @receiver(post_delete, sender=BusinessImage)
 def delete_business_image(sender, instance, **kwargs):
     if instance.image:
-        delete_image(instance.image.path)
+        file_deletion.delete(instance.image)
+    delete_variants(instance)
+
+
+@receiver(pre_save, sender=BusinessImage)
+def delete_old_business_image(sender, instance, **kwargs):
+    if not instance.pk:
+        instance._image_changed = True
+        return False
+
+    old_instance = get_old_instance(instance)
+    if old_instance is None:
+        return False
+
+    if old_instance.image != instance.image:
+        replace_variants(instance, old_instance)
+        if old_instance.image:
+            file_deletion.delete(old_instance.image)
 
 
 @receiver(post_delete, sender=Employee)
 def delete_employee_image(sender, instance, **kwargs):
    if instance.image:
-        delete_image(instance.image.path)
+        file_deletion.delete(instance.image)
+   delete_variants(instance)
 
 
 @receiver(pre_save, sender=Employee)
 def delete_old_employee_image(sender, instance, **kwargs):
     if not instance.pk:
+        instance._image_changed = bool(instance.image)
         return False
 
-    try:
-        old_instance = Employee.objects.get(pk=instance.pk)
-    except Employee.DoesNotExist:
+    old_instance = get_old_instance(instance)
+    if old_instance is None:
         return False
 
     old_image = old_instance.image
+    if old_image != instance.image:
+        replace_variants(instance, old_instance)
     if old_image and old_image != instance.image:
-        delete_image(old_image.path)
+        file_deletion.delete(old_image)
 
 
 @receiver(pre_save, sender=Business)
 def delete_old_logo_on_update(sender, instance, **kwargs):
     if not instance.pk:
+        instance._image_changed = bool(instance.logo)
         return False
 
-    try:
-        old_instance = Business.objects.get(pk=instance.pk)
-    except Business.DoesNotExist:
+    old_instance = get_old_instance(instance)
+    if old_instance is None:
         return False
 
     old_logo = old_instance.logo
     new_logo = instance.logo
 
+    if old_logo != new_logo:
+        replace_variants(instance, old_instance)
     if old_logo and old_logo != new_logo:
-        delete_image(old_logo.path)
+        file_deletion.delete(old_logo)
 
 
 @receiver(post_delete, sender=Business)
 def delete_business_logo_and_images(sender, instance, **kwargs):
     if instance.logo:
-        delete_image(instance.logo.path)
+        file_deletion.delete(instance.logo)
+    delete_variants(instance)
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_save, sender=BusinessImage)
+@receiver(post_save, sender=Employee)
+def schedule_image_variants(sender, instance, **kwargs):
+    if instance.__dict__.pop('_image_changed', False):
+        images.schedule(instance)
+
+
+@receiver(pre_save, sender=Order)
+def invalidate_old_order_availability(sender, instance, **kwargs):
+    if not instance.pk:
+        return False
+
+    old_instance = get_old_instance(instance)
+    if old_instance is None:
+        return False
+
+    if old_instance.employee_id != instance.employee_id or old_instance.start_time != instance.start_time:
+        availability_cache.invalidate_day(old_instance.employee_id, timezone.localdate(old_instance.start_time))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_availability(sender, instance, **kwargs):
+    availability_cache.invalidate_day(instance.employee_id, timezone.localdate(instance.start_time))
+
+
+@receiver(post_save, sender=EmployeeWorkSchedule)
+@receiver(post_delete, sender=EmployeeWorkSchedule)
+def invalidate_schedule_availability(sender, instance, **kwargs):
+    availability_cache.invalidate_employee(instance.employee_id)
+
+
+@receiver(pre_save, sender=Employee)
+def invalidate_employee_availability(sender, instance, **kwargs):
+    if not instance.pk:
+        return False
+
+    old_instance = get_old_instance(instance)
+    if old_instance is not None and old_instance.duration != instance.duration:
+        availability_cache.invalidate_employee(instance.pk)
+
+
+@receiver(pre_save, sender=Service)
+def invalidate_service_availability(sender, instance, **kwargs):
+    if not instance.pk:
+        return False
+
+    old_instance = get_old_instance(instance)
+    if old_instance is not None and old_instance.duration != instance.duration:
+        employee_ids = instance.employees.filter(duration__isnull=True).values_list('pk', flat=True)
+        for employee_id in employee_ids:
+            availability_cache.invalidate_employee(employee_id)
+
+
+@receiver(request_started, dispatch_uid='App.build_search_index')
+def build_search_index(sender, **kwargs):
+    # Once per server process, so the first search does not wait for the
+    # build. The test client's handlers are left out.
+    if not issubclass(sender, (WSGIHandler, ASGIHandler)):
+        return
+    request_started.disconnect(dispatch_uid='App.build_search_index')
+    search.start_build()
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+def reindex_business_search(sender, instance, **kwargs):
+    search.schedule_reindex([instance.pk])
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def reindex_business_search_terms(sender, instance, **kwargs):
+    search.schedule_reindex([instance.business_id])
+
+
+@receiver(post_save, sender=ServiceName)
+def reindex_service_name_search(sender, instance, created, **kwargs):
+    if not created:
+        search.schedule_reindex(Service.objects.filter(service_name=instance).values_list('business_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=EmployeeRole)
+def reindex_employee_role_search(sender, instance, created, **kwargs):
+    if not created:
+        search.schedule_reindex(Employee.objects.filter(role=instance).values_list('business_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+def invalidate_business_responses(sender, instance, **kwargs):
+    response_cache.invalidate_business(instance.pk)
+
+
+@receiver(post_save, sender=BusinessImage)
+@receiver(post_delete, sender=BusinessImage)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_business_child_responses(sender, instance, **kwargs):
+    response_cache.invalidate_business(instance.business_id)
+
+
+@receiver(post_save, sender=EmployeeWorkSchedule)
+@receiver(post_delete, sender=EmployeeWorkSchedule)
+def invalidate_schedule_responses(sender, instance, **kwargs):
+    if EmployeeWorkSchedule.employee.is_cached(instance):
+        business_id = instance.employee.business_id
+    else:
+        business_id = Employee.objects.filter(pk=instance.employee_id).values_list('business_id', flat=True).first()
+    if business_id is not None:
+        response_cache.invalidate_business(business_id)
+
+
+@receiver(post_save, sender=BusinessType)
+@receiver(post_delete, sender=BusinessType)
+def invalidate_business_type_responses(sender, instance, **kwargs):
+    response_cache.invalidate_catalog()
+
+
+@receiver(post_save, sender=ServiceName)
+@receiver(post_delete, sender=ServiceName)
+@receiver(post_save, sender=EmployeeRole)
+@receiver(post_delete, sender=EmployeeRole)
+def invalidate_name_responses(sender, instance, created=False, **kwargs):
+    # A new name shows up nowhere until a service or employee uses it
+    if not created:
+        response_cache.invalidate_catalog()
+
+
+def bulk_create(model, instances):
+    """
+    ``bulk_create`` followed by what the ``post_save`` receivers above do
+    for new rows, which ``bulk_create`` skips. Every cache is invalidated
+    once per employee, day or business instead of once per row.
+    """
+    instances = model.objects.bulk_create(instances)
+    if model is Order:
+        for employee_id, date in {(order.employee_id, timezone.localdate(order.start_time)) for order in instances}:
+            availability_cache.invalidate_day(employee_id, date)
+    elif model is EmployeeWorkSchedule:
+        for employee in {schedule.employee for schedule in instances}:
+            availability_cache.invalidate_employee(employee.pk)
+            response_cache.invalidate_business(employee.business_id)
+    elif model is BusinessImage:
+        for image in instances:
+            images.schedule(image)
+        for business_id in {image.business_id for image in instances}:
+            response_cache.invalidate_business(business_id)
+    else:
+        raise ValueError(f'No post_save equivalent for {model.__name__}.')
+    return instances
@@ -1,3 +1,1297 @@
-from django.test import TestCase
+import json
+import math
+import shutil
+import tempfile
+import threading
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import OperationalError, connection, transaction
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from Account import authentication
+from Account.models import User
+from Equeue import instrumentation, versions
+from . import availability, availability_cache, file_deletion, geo, images, lookups, response_cache, search, signals
+from .management.fixtures import placeholder_image
+from .models import *
+from .serializers import EmployeeSerializer, OrderSerializer
+
+
+class BookingFixture:
+    """One business with a 30 minute service and an employee working 09:00-12:00 tomorrow."""
+
+    @classmethod
+    def create_fixture(cls):
+        cls.user = User.objects.create(phone='998901234567', is_active=True)
+        cls.client_user = User.objects.create(phone='998911234567', is_active=True)
+        business_type = BusinessType.objects.create(name='Barbershop')
+        cls.business = Business.objects.create(
+            creator=cls.user, business_type=business_type, name='Barber', description='',
+            logo='businesses/logos/barber.png', latitude=41.3, longitude=69.2,
+        )
+        service_name = ServiceName.objects.create(business_type=business_type, name='Haircut')
+        cls.service = Service.objects.create(business=cls.business, service_name=service_name, duration=timedelta(minutes=30))
+        cls.role = EmployeeRole.objects.create(business_type=business_type, name='Barber')
+        cls.employee = Employee.objects.create(business=cls.business, role=cls.role, first_name='A', last_name='B', patronymic='C')
+        cls.employee.service.set([cls.service])
+        cls.date = timezone.localdate() + timedelta(days=1)
+        EmployeeWorkSchedule.objects.create(employee=cls.employee, workday=availability.get_workday(cls.date), start_time=time(9), end_time=time(12))
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.date, time(hour, minute)), timezone.get_current_timezone())
+
+    def local(self, hour, minute=0):
+        return self.at(hour, minute).strftime('%Y-%m-%d %H:%M')
+
+    def create_order(self, hour, minute=0, user=None):
+        return Order.objects.create(
+            user=user or self.client_user, business=self.business, employee=self.employee, service=self.service,
+            start_time=self.at(hour, minute), end_time=self.at(hour, minute) + timedelta(minutes=30),
+        )
+
+
+class BookingTestCase(BookingFixture, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixture()
+
+    def setUp(self):
+        cache.clear()
+        authentication.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Inspects SQLite query plans.')
+class OrderDateFilterTests(TestCase):
+    """
+    Order lookups by day must filter ``start_time`` with a plain range, so
+    they can use the ``(employee, start_time)`` indexes. A ``__date`` lookup
+    wraps the column in ``django_datetime_cast_date`` and scans instead.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone='998901234567', is_active=True)
+        business_type = BusinessType.objects.create(name='Barbershop')
+        cls.business = Business.objects.create(
+            creator=cls.user, business_type=business_type, name='Barber', description='',
+            logo='businesses/logos/barber.png', latitude=41.3, longitude=69.2,
+        )
+        service_name = ServiceName.objects.create(business_type=business_type, name='Haircut')
+        cls.service = Service.objects.create(business=cls.business, service_name=service_name, duration=timedelta(minutes=30))
+        role = EmployeeRole.objects.create(business_type=business_type, name='Barber')
+        cls.employee = Employee.objects.create(business=cls.business, role=role, first_name='A', last_name='B', patronymic='C')
+        cls.date = timezone.localdate() + timedelta(days=1)
+        EmployeeWorkSchedule.objects.create(employee=cls.employee, workday=availability.get_workday(cls.date), start_time=time(9), end_time=time(12))
+        start_time = timezone.make_aware(datetime.combine(cls.date, time(9)), timezone.get_current_timezone())
+        Order.objects.create(
+            user=cls.user, business=cls.business, employee=cls.employee, service=cls.service,
+            start_time=start_time, end_time=start_time + timedelta(minutes=30),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertOrderQueriesUseIndex(self, queries, index_name):
+        order_queries = [query['sql'] for query in queries if 'FROM "App_order"' in query['sql']]
+        self.assertTrue(order_queries)
+        for sql in order_queries:
+            self.assertNotIn('django_datetime_cast_date', sql)
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+            self.assertIn(index_name, plan)
+
+    def test_user_order_list(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/app/user/employee/{self.employee.pk}/order/', {'date': str(self.date)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertOrderQueriesUseIndex(queries, 'order_user_employee_start_idx')
+
+    def test_business_order_list(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/app/business/employee/{self.employee.pk}/order/', {'date': str(self.date)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertOrderQueriesUseIndex(queries, 'order_employee_start_idx')
+
+    def test_available_times(self):
+        with CaptureQueriesContext(connection) as queries:
+            available_times = availability.calculate_available_times(self.employee, self.service, self.date)
+        self.assertEqual(available_times[0], {"start_time": "09:30", "end_time": "10:00"})
+        self.assertOrderQueriesUseIndex(queries, 'order_employee_start_idx')
+
+    def test_available_times_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            days = availability.calculate_available_times_range(self.employee, self.service, self.date, self.date + timedelta(days=6))
+        self.assertEqual(len(days), 7)
+        self.assertOrderQueriesUseIndex(queries, 'order_employee_start_idx')
+
+
+class AsyncViewTests(BookingTestCase):
+    """The async views answer exactly like their sync counterparts."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_order(10)
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=self.user).key}'}
+
+    async def assertSameAsSync(self, path, headers=None, status_code=200):
+        headers = self.headers if headers is None else headers
+        response = await AsyncClient().get(f'/app/async/{path}', headers=headers)
+        sync_response = await sync_to_async(APIClient(headers=headers).get)(f'/app/{path}')
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(sync_response.status_code, status_code)
+        # Cursor links point at the view that served the page
+        data = json.loads(response.content.decode().replace('/app/async/', '/app/'))
+        self.assertEqual(data, sync_response.json())
+        return data
+
+    async def test_business_list(self):
+        data = await self.assertSameAsSync('business/?page_size=1')
+        self.assertEqual([business['id'] for business in data['results']], [self.business.pk])
+        self.assertIn('next', data)
+
+    async def test_business_list_pages(self):
+        second = await Business.objects.acreate(
+            creator=self.user, business_type_id=self.business.business_type_id, name='Second', description='',
+            logo='businesses/logos/second.png', latitude=41.3, longitude=69.2,
+        )
+        data = await self.assertSameAsSync('business/?page_size=1')
+        following = await self.assertSameAsSync('business/' + data['next'].split('/business/')[1])
+        self.assertEqual([business['id'] for business in following['results']], [second.pk])
+        self.assertIsNone(following['next'])
+        previous = await self.assertSameAsSync('business/' + following['previous'].split('/business/')[1])
+        self.assertEqual(previous['results'], data['results'])
+
+    async def test_business_list_nearby(self):
+        data = await self.assertSameAsSync('business/?lat=41.3&lon=69.21&radius=2')
+        self.assertEqual(data[0]['id'], self.business.pk)
+        await self.assertSameAsSync('business/?lat=100&lon=0', status_code=400)
+
+    async def test_available_times(self):
+        path = f'business/{self.business.pk}/service/{self.service.pk}/employee/{self.employee.pk}/evailabe/'
+        data = await self.assertSameAsSync(f'{path}?date={self.date}')
+        self.assertNotIn({"start_time": "10:00", "end_time": "10:30"}, data)
+        await self.assertSameAsSync(f'{path}?date=2000-01-01', status_code=400)
+        await self.assertSameAsSync(path, headers={}, status_code=401)
+
+    async def test_available_times_range(self):
+        path = f'business/{self.business.pk}/service/{self.service.pk}/employee/{self.employee.pk}/evailabe/'
+        data = await self.assertSameAsSync(f'{path}?date_from={self.date}&date_to={self.date + timedelta(days=2)}')
+        self.assertEqual(len(data['days']), 3)
+        self.assertTrue(data['summary'][str(self.date)])
+
+    async def test_user_order_list(self):
+        self.headers = {'Authorization': f'Token {(await Token.objects.acreate(user=self.client_user)).key}'}
+        data = await self.assertSameAsSync(f'user/employee/{self.employee.pk}/order/?date={self.date}')
+        self.assertEqual(len(data), 1)
+
+    async def test_business_order_list(self):
+        data = await self.assertSameAsSync(f'business/employee/{self.employee.pk}/order/?date={self.date}')
+        self.assertEqual(len(data), 1)
+        headers = {'Authorization': f'Token {(await Token.objects.acreate(user=self.client_user)).key}'}
+        await self.assertSameAsSync(f'business/employee/{self.employee.pk}/order/', headers=headers, status_code=403)
+
+
+class BulkOrderCreateTests(BookingTestCase):
+
+    def post(self, *items):
+        return self.client.post(f'/app/business/{self.business.pk}/order/bulk/', list(items), format='json')
+
+    def item(self, hour, minute=0, **extra):
+        return {
+            'employee': self.employee.pk, 'service': self.service.pk,
+            'start_time': self.local(hour, minute),
+            'end_time': (self.at(hour, minute) + timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M'), **extra,
+        }
+
+    def test_partial_success(self):
+        self.create_order(10)
+        response = self.post(self.item(9), self.item(10))
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([order['start_time'] for order in response.data['created']], [self.local(9)])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+
+    def test_overlap_within_batch(self):
+        response = self.post(self.item(9), self.item(9, 15), self.item(9, 30))
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+
+    def test_item_limit(self):
+        response = self.post(*[self.item(9)] * 201)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_user(self):
+        response = self.post(self.item(9), self.item(10, user=self.client_user.pk), self.item(11, user=0))
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([order['user'] for order in response.data['created']], [self.user.pk, self.client_user.pk])
+        self.assertEqual(response.data['errors'], [{'index': 2, 'errors': {'user': 'User does not exist.'}}])
+
+    def test_service_not_provided_by_employee(self):
+        service_name = ServiceName.objects.create(business_type=self.business.business_type, name='Shave')
+        other = Service.objects.create(business=self.business, service_name=service_name, duration=timedelta(minutes=30))
+        response = self.post(self.item(9, service=other.pk))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['errors'], {'service': 'The employee does not provide this service.'})
+
+    def test_hold_blocks_other_users_only(self):
+        SlotHold.objects.create(
+            user=self.client_user, employee=self.employee, service=self.service,
+            start_time=self.at(9), end_time=self.at(9, 30), expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        response = self.post(self.item(9), self.item(9, user=self.client_user.pk))
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([order['user'] for order in response.data['created']], [self.client_user.pk])
+
+    def test_queries_do_not_grow_with_employees(self):
+        other = Employee.objects.create(business=self.business, role=self.role, first_name='D', last_name='E', patronymic='F')
+        other.service.set([self.service])
+        EmployeeWorkSchedule.objects.create(employee=other, workday=availability.get_workday(self.date), start_time=time(9), end_time=time(12))
+
+        with CaptureQueriesContext(connection) as one_employee:
+            self.post(self.item(9))
+        with CaptureQueriesContext(connection) as two_employees:
+            self.post(self.item(10), self.item(10, employee=other.pk))
+        self.assertEqual(len(one_employee), len(two_employees))
+        self.assertEqual(Order.objects.count(), 3)
+
+
+class SearchTests(BookingTestCase):
+
+    def test_prefix_ranks_all_matching_terms(self):
+        index = search.SearchIndex()
+        for business_id in range(100):
+            index.add(business_id, {f'bar{business_id:03}': search.DESCRIPTION_WEIGHT})
+        # Sorts after the first 64 terms starting with "bar"
+        index.add(100, {'barber': search.NAME_WEIGHT})
+
+        self.assertEqual(index.search('bar', limit=1), [(search.NAME_WEIGHT * search.PREFIX_FACTOR, 100)])
+        self.assertEqual(len(index.search('bar', limit=200)), 101)
+
+    def test_short_prefix_top_list(self):
+        index = search.SearchIndex()
+        index.add(1, {'barber': search.DESCRIPTION_WEIGHT})
+        index.add(2, {'bath': search.SERVICE_WEIGHT})
+        self.assertEqual(index.search('b'), [(search.SERVICE_WEIGHT * search.PREFIX_FACTOR, 2), (search.DESCRIPTION_WEIGHT * search.PREFIX_FACTOR, 1)])
+
+        # Adding and removing terms with the prefix drop its top list
+        index.add(3, {'ba': search.NAME_WEIGHT})
+        self.assertEqual(index.search('ba', limit=1), [(search.NAME_WEIGHT, 3)])
+        self.assertEqual(index.search('b', limit=1), [(search.NAME_WEIGHT * search.PREFIX_FACTOR, 3)])
+        index.remove(3)
+        self.assertEqual(index.search('b', limit=1), [(search.SERVICE_WEIGHT * search.PREFIX_FACTOR, 2)])
+
+    def test_short_tokens_before_the_last_match_whole_terms(self):
+        index = search.SearchIndex()
+        index.add(1, {'hair': search.NAME_WEIGHT, 'cut': search.SERVICE_WEIGHT})
+        index.add(2, {'hair': search.NAME_WEIGHT, 'cu': search.SERVICE_WEIGHT})
+        self.assertEqual([business_id for score, business_id in index.search('hair cu')], [2, 1])
+        self.assertEqual([business_id for score, business_id in index.search('cu hair')], [2])
+
+    def test_narrowed_tokens_match_business_terms(self):
+        index = search.SearchIndex()
+        for business_id in range(100):
+            index.add(business_id, {f'bar{business_id:03}': search.DESCRIPTION_WEIGHT, 'shop': search.NAME_WEIGHT})
+        index.add(100, {'barber': search.NAME_WEIGHT, 'salon': search.NAME_WEIGHT})
+        # "salon" leaves one business, "bar" is then matched against its terms only
+        self.assertEqual(index.search('bar salon'), [(search.NAME_WEIGHT * search.PREFIX_FACTOR + search.NAME_WEIGHT, 100)])
+        self.assertEqual(len(index.search('shop bar', limit=200)), 100)
+
+    def test_not_ready(self):
+        with mock.patch.object(search, '_index', None), mock.patch.object(search, '_rebuilding', True):
+            response = self.client.get('/app/search/', {'q': 'barber'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_search_does_not_build(self):
+        with mock.patch.object(search, '_index', search.build_index()), mock.patch.object(search, '_built_at', float('inf')):
+            with mock.patch.object(search, 'build_index') as build_index:
+                response = self.client.get('/app/search/', {'q': 'hair'})
+            build_index.assert_not_called()
+        self.assertEqual([business['id'] for business in response.data], [self.business.pk])
+
+    def test_changes_during_first_build_are_replayed(self):
+        with mock.patch.object(search, '_index', None), mock.patch.object(search, '_rebuilding', True), \
+                mock.patch.object(search, '_pending', set()):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.business.save()
+            self.assertEqual(search._pending, {self.business.pk})
+
+
+class OrderCreateTests(BookingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.client_user)
+
+    def post(self, hour, minute=0):
+        return self.client.post(f'/app/user/employee/{self.employee.pk}/order/', {
+            'service': self.service.pk, 'start_time': self.local(hour, minute),
+            'end_time': (self.at(hour, minute) + timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M'),
+        })
+
+    def test_overlapping_order_rejected(self):
+        self.assertEqual(self.post(9).status_code, 201)
+        response = self.post(9, 15)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start_time', response.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_back_to_back_orders(self):
+        self.assertEqual(self.post(9).status_code, 201)
+        self.assertEqual(self.post(9, 30).status_code, 201)
+        self.assertEqual(self.post(8, 30).status_code, 400)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite has no row locks.')
+    def test_sqlite_lock_before_overlap_check(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.post(9).status_code, 201)
+        sql = [query['sql'] for query in queries]
+        lock = next(i for i, query in enumerate(sql) if query.startswith('UPDATE "App_employee" SET "duration" = "App_employee"."duration"'))
+        check = next(i for i, query in enumerate(sql) if 'FROM "App_order"' in query)
+        self.assertLess(lock, check)
+
+    @skipUnless(connection.features.has_select_for_update, 'The backend has no row locks.')
+    def test_row_lock_before_overlap_check(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.post(9).status_code, 201)
+        sql = [query['sql'] for query in queries]
+        lock = next(i for i, query in enumerate(sql) if 'FROM "App_employee"' in query and 'FOR UPDATE' in query)
+        check = next(i for i, query in enumerate(sql) if 'FROM "App_order"' in query)
+        self.assertLess(lock, check)
+
+
+class ConcurrentOrderTests(BookingFixture, TransactionTestCase):
+    """Two clients booking the same slot at once get one order between them."""
+
+    def setUp(self):
+        cache.clear()
+        authentication.clear()
+        # No background image rendering or index build competing for the database
+        for patcher in (mock.patch.object(images, 'schedule'), mock.patch.object(search, 'start_build')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.create_fixture()
+
+    def book(self, user, barrier, results):
+        # The serializer rather than the test client, whose exception capture
+        # is shared between threads
+        data = {'service': self.service.pk, 'start_time': self.local(9), 'end_time': self.local(9, 30)}
+        context = {'business': self.business, 'employee': self.employee, 'user': user}
+        barrier.wait()
+        try:
+            while True:
+                serializer = OrderSerializer(data=data, context=context)
+                try:
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+                except serializers.ValidationError:
+                    results.append(user)
+                    return
+                except OperationalError:
+                    # SQLite refuses a write while another transaction writes
+                    continue
+                results.append(serializer.instance)
+                return
+        finally:
+            connection.close()
+
+    def test_one_order_per_slot(self):
+        barrier = threading.Barrier(2)
+        results = []
+        threads = [threading.Thread(target=self.book, args=(user, barrier, results)) for user in (self.user, self.client_user)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        orders = [result for result in results if isinstance(result, Order)]
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(list(Order.objects.all()), orders)
+
+
+class SlotHoldTests(BookingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.client_user)
+        self.owner_client = APIClient()
+        self.owner_client.force_authenticate(self.user)
+
+    def slot(self, hour, minute=0):
+        return {
+            'service': self.service.pk, 'start_time': self.local(hour, minute),
+            'end_time': (self.at(hour, minute) + timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M'),
+        }
+
+    def hold(self, hour, minute=0, client=None):
+        return (client or self.client).post(f'/app/user/employee/{self.employee.pk}/hold/', self.slot(hour, minute))
+
+    def order(self, hour, minute=0, client=None):
+        return (client or self.client).post(f'/app/user/employee/{self.employee.pk}/order/', self.slot(hour, minute))
+
+    def create_hold(self, employee=None, expires_in=timedelta(minutes=5)):
+        return SlotHold.objects.create(
+            user=self.client_user, employee=employee or self.employee, service=self.service,
+            start_time=self.at(9), end_time=self.at(9, 30), expires_at=timezone.now() + expires_in,
+        )
+
+    def test_confirm(self):
+        hold = self.hold(9).data
+        response = self.client.post(f"/app/user/hold/{hold['id']}/confirm/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['start_time'], self.local(9))
+        self.assertFalse(SlotHold.objects.exists())
+        self.assertEqual(self.client.post(f"/app/user/hold/{hold['id']}/confirm/").status_code, 404)
+
+    def test_expired_hold(self):
+        hold = self.create_hold(expires_in=-timedelta(seconds=1))
+        response = self.client.post(f'/app/user/hold/{hold.pk}/confirm/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.create_hold(expires_in=-timedelta(seconds=1))
+        # An expired hold blocks nobody
+        self.assertEqual(self.order(9, client=self.owner_client).status_code, 201)
+
+    def test_schedule_changed_since_hold(self):
+        hold = self.create_hold()
+        self.employee.work_schedules.update(start_time=time(10))
+        response = self.client.post(f'/app/user/hold/{hold.pk}/confirm/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start_time', response.data)
+        self.assertFalse(Order.objects.exists())
+
+    def test_duration_changed_since_hold(self):
+        hold = self.create_hold()
+        self.service.duration = timedelta(minutes=45)
+        self.service.save()
+        response = self.client.post(f'/app/user/hold/{hold.pk}/confirm/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('end_time', response.data)
+        self.assertFalse(Order.objects.exists())
+
+    def test_release(self):
+        hold = self.hold(9).data
+        self.assertEqual(self.hold(9, client=self.owner_client).status_code, 400)
+        self.assertEqual(self.client.delete(f"/app/user/hold/{hold['id']}/").status_code, 204)
+        self.assertEqual(self.hold(9, client=self.owner_client).status_code, 201)
+
+    def test_hold_blocks_other_users_order(self):
+        self.assertEqual(self.hold(9).status_code, 201)
+        self.assertEqual(self.order(9, 15, client=self.owner_client).status_code, 400)
+        self.assertEqual(self.order(9).status_code, 201)
+
+    def test_cleanup_only_for_locked_employee(self):
+        other = Employee.objects.create(business=self.business, role=self.role, first_name='D', last_name='E', patronymic='F')
+        expired = self.create_hold(employee=other, expires_in=-timedelta(seconds=1))
+        self.create_hold(expires_in=-timedelta(seconds=1))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.hold(10, client=self.owner_client).status_code, 201)
+        self.assertTrue(SlotHold.objects.filter(pk=expired.pk).exists())
+        self.assertEqual(SlotHold.objects.filter(employee=self.employee).count(), 1)
+        self.assertTrue(any(
+            query['sql'].startswith('DELETE FROM "App_slothold"') and 'employee_id' in query['sql'] for query in queries
+        ))
+
+
+class DirtyFieldsTests(BookingTestCase):
+
+    def load(self):
+        return Business.objects.get(pk=self.business.pk)
+
+    def test_changed_fields(self):
+        business = self.load()
+        self.assertEqual(business.get_changed_fields(), [])
+        business.name = 'Barber shop'
+        business.creator_id = self.client_user.pk
+        self.assertEqual(business.get_changed_fields(), ['creator', 'name'])
+        self.assertTrue(business.has_changed('creator'))
+        self.assertEqual(business.get_loaded_instance().name, 'Barber')
+
+        business.save()
+        self.assertEqual(business.get_changed_fields(), [])
+
+    def test_untracked_instance(self):
+        business = Business(pk=self.business.pk, name='Barber')
+        self.assertFalse(business.is_tracked())
+        self.assertIn('name', business.get_changed_fields())
+        self.assertIsNone(business.get_loaded_instance())
+
+    def test_update_fields_keep_other_changes(self):
+        business = self.load()
+        business.name = 'Barber shop'
+        business.description = 'Haircuts'
+        business.save(update_fields=['name'])
+        self.assertEqual(business.get_changed_fields(), ['description'])
+        self.assertEqual(self.load().description, '')
+
+    def test_loaded_instance_skips_pre_save_query(self):
+        business = self.load()
+        business.name = 'Barber shop'
+        with CaptureQueriesContext(connection) as queries:
+            business.save(update_fields=business.get_changed_fields())
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['UPDATE'])
+
+        untracked = self.load()
+        del untracked._loaded_values
+        untracked.name = 'Barber'
+        with CaptureQueriesContext(connection) as queries:
+            untracked.save(update_fields=['name'])
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['SELECT', 'UPDATE'])
+
+    def test_refresh_from_db(self):
+        business = self.load()
+        Business.objects.filter(pk=business.pk).update(name='Barber shop', description='Haircuts')
+
+        business.refresh_from_db(fields=['name'])
+        self.assertEqual(business.get_changed_fields(), [])
+        self.assertEqual(business.get_loaded_instance().name, 'Barber shop')
+        self.assertEqual(business.get_loaded_instance().description, '')
+
+        business.refresh_from_db()
+        self.assertEqual(business.get_changed_fields(), [])
+        self.assertEqual(business.get_loaded_instance().description, 'Haircuts')
+
+
+class ResponseCacheTests(BookingTestCase):
+
+    def get(self, **headers):
+        return self.client.get(f'/app/business/{self.business.pk}/', headers=headers)
+
+    def assertSameHeaders(self, response, fresh, headers=('ETag', 'Allow', 'Vary')):
+        self.assertEqual({header: response.get(header) for header in headers}, {header: fresh.get(header) for header in headers})
+
+    def test_cached_responses_keep_headers(self):
+        with CaptureQueriesContext(connection) as queries:
+            fresh = self.get()
+        self.assertTrue(queries)
+        self.assertEqual(fresh['Vary'], 'Accept, Authorization')
+        self.assertIn('GET', fresh['Allow'])
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.get()
+            not_modified = self.get(if_none_match=fresh['ETag'])
+        self.assertEqual(len(queries), 0)
+        self.assertEqual((cached.status_code, not_modified.status_code), (200, 304))
+        self.assertEqual(cached.content, fresh.content)
+        self.assertSameHeaders(cached, fresh, ('ETag', 'Allow', 'Vary', 'Content-Type'))
+        self.assertSameHeaders(not_modified, fresh)
+
+    def test_not_modified_on_fresh_response(self):
+        etag = self.get()['ETag']
+        cache.clear()
+        fresh = self.get()
+        cache.clear()
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertSameHeaders(response, fresh)
+
+
+class VersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_get_versions_creates_missing(self):
+        first = versions.get_versions(['a', 'b'])
+        self.assertEqual(versions.get_versions(['a', 'b']), first)
+        self.assertNotEqual(first['a'], first['b'])
+
+    def test_bump_again_on_commit(self):
+        before = versions.get_version('a')
+        with self.captureOnCommitCallbacks() as callbacks:
+            versions.bump('a')
+        bumped = versions.get_version('a')
+        self.assertNotEqual(bumped, before)
+        callbacks[0]()
+        self.assertNotIn(versions.get_version('a'), (before, bumped))
+
+
+class AvailabilityCacheTests(BookingTestCase):
+    """Cached slot maps are dropped by the writes they depend on."""
+
+    def setUp(self):
+        super().setUp()
+        availability_cache.reset_stats()
+
+    def starts(self):
+        response = self.client.get(
+            f'/app/business/{self.business.pk}/service/{self.service.pk}/employee/{self.employee.pk}/evailabe/',
+            {'date': str(self.date)},
+        )
+        self.assertEqual(response.status_code, 200)
+        return [slot['start_time'] for slot in response.data]
+
+    def test_cache_hit(self):
+        self.assertEqual(len(self.starts()), 6)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.starts()), 6)
+        self.assertFalse([query for query in queries if 'App_order' in query['sql'] or 'App_employeeworkschedule' in query['sql']])
+
+    def test_order_save_and_delete(self):
+        self.assertIn('09:00', self.starts())
+        order = self.create_order(9)
+        self.assertNotIn('09:00', self.starts())
+
+        order.start_time, order.end_time = self.at(10), self.at(10, 30)
+        order.save()
+        starts = self.starts()
+        self.assertIn('09:00', starts)
+        self.assertNotIn('10:00', starts)
+
+        order.delete()
+        self.assertIn('10:00', self.starts())
+
+    def test_order_moved_to_another_day(self):
+        order = self.create_order(9)
+        self.assertNotIn('09:00', self.starts())
+        order.start_time += timedelta(days=7)
+        order.end_time += timedelta(days=7)
+        order.save()
+        self.assertIn('09:00', self.starts())
+
+    def test_schedule_change(self):
+        self.assertEqual(self.starts()[-1], '11:30')
+        schedule = EmployeeWorkSchedule.objects.get(employee=self.employee)
+        schedule.end_time = time(10)
+        schedule.save()
+        self.assertEqual(self.starts(), ['09:00', '09:30'])
+
+        schedule.delete()
+        self.assertEqual(self.starts(), [])
+
+    def test_service_duration_change(self):
+        self.assertEqual(len(self.starts()), 6)
+        self.service.duration = timedelta(hours=1)
+        self.service.save()
+        self.assertEqual(self.starts(), ['09:00', '10:00', '11:00'])
+
+    def test_employee_duration_change(self):
+        self.assertEqual(len(self.starts()), 6)
+        employee = Employee.objects.get(pk=self.employee.pk)
+        employee.duration = timedelta(minutes=90)
+        employee.save()
+        self.assertEqual(self.starts(), ['09:00', '10:30'])
+
+    def test_stats(self):
+        self.starts()
+        self.starts()
+        self.create_order(9)
+        self.starts()
+
+        self.user.is_staff = True
+        response = self.client.get('/app/availability/cache-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3})
+
+        self.client.force_authenticate(self.client_user)
+        self.assertEqual(self.client.get('/app/availability/cache-stats/').status_code, 403)
+
+
+class AvailabilitySweepTests(BookingTestCase):
+    """The sweep keeps the slot semantics of the former per-slot queries."""
+
+    def slots(self, duration=None):
+        if duration is not None:
+            self.service.duration = duration
+        return [
+            (slot['start_time'], slot['end_time'])
+            for slot in availability.calculate_available_times(self.employee, self.service, self.date)
+        ]
+
+    def test_free_day(self):
+        self.assertEqual(self.slots(), [
+            ('09:00', '09:30'), ('09:30', '10:00'), ('10:00', '10:30'),
+            ('10:30', '11:00'), ('11:00', '11:30'), ('11:30', '12:00'),
+        ])
+
+    def test_back_to_back_orders(self):
+        self.create_order(9, 30)
+        self.create_order(10)
+        self.assertEqual(self.slots(), [('09:00', '09:30'), ('10:30', '11:00'), ('11:00', '11:30'), ('11:30', '12:00')])
+
+    def test_order_crossing_schedule_end(self):
+        Order.objects.create(
+            user=self.client_user, business=self.business, employee=self.employee, service=self.service,
+            start_time=self.at(11, 45), end_time=self.at(12, 15),
+        )
+        self.assertEqual(self.slots()[-2:], [('10:30', '11:00'), ('11:00', '11:30')])
+
+    def test_off_grid_order(self):
+        Order.objects.create(
+            user=self.client_user, business=self.business, employee=self.employee, service=self.service,
+            start_time=self.at(9, 50), end_time=self.at(10, 10),
+        )
+        self.assertEqual(self.slots(), [('09:00', '09:30'), ('10:30', '11:00'), ('11:00', '11:30'), ('11:30', '12:00')])
+
+    def test_service_longer_than_gap(self):
+        self.create_order(9)
+        self.create_order(10)
+        # The 30 minute gap at 09:30 can not take 45 minutes
+        self.assertEqual(self.slots(timedelta(minutes=45)), [('10:30', '11:15'), ('11:15', '12:00')])
+
+    def test_last_slot_may_overrun_schedule(self):
+        # As before, the grid runs while a slot starts before the schedule ends
+        self.assertEqual(self.slots(timedelta(minutes=50)), [
+            ('09:00', '09:50'), ('09:50', '10:40'), ('10:40', '11:30'), ('11:30', '12:20'),
+        ])
+
+    def test_split_schedule(self):
+        EmployeeWorkSchedule.objects.create(employee=self.employee, workday=availability.get_workday(self.date), start_time=time(14), end_time=time(15))
+        self.create_order(14)
+        self.assertEqual(self.slots(timedelta(hours=1))[-1:], [('11:00', '12:00')])
+        self.assertEqual(self.slots(timedelta(minutes=30))[-1], ('14:30', '15:00'))
+
+
+class AvailabilityRangeTests(BookingTestCase):
+
+    def calculate(self, days):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            result = availability.calculate_available_times_range(
+                self.employee, self.service, self.date, self.date + timedelta(days=days - 1)
+            )
+        self.assertEqual(len(result), days)
+        return result, len(queries)
+
+    def test_query_count_does_not_grow_with_range(self):
+        self.create_order(9)
+        Order.objects.create(
+            user=self.client_user, business=self.business, employee=self.employee, service=self.service,
+            start_time=self.at(10) + timedelta(days=7), end_time=self.at(10, 30) + timedelta(days=7),
+        )
+        one_day, one_day_queries = self.calculate(1)
+        two_weeks, two_weeks_queries = self.calculate(14)
+        self.assertEqual(one_day_queries, two_weeks_queries)
+
+        self.assertEqual(two_weeks[0], one_day[0])
+        self.assertNotIn({'start_time': '10:00', 'end_time': '10:30'}, two_weeks[7]['slots'])
+        self.assertEqual(len(two_weeks[7]['slots']), 5)
+        self.assertEqual([day['slots'] for day in two_weeks if day['date'].weekday() != self.date.weekday()], [[]] * 12)
+
+    def test_range_matches_single_days(self):
+        self.create_order(10)
+        days, queries = self.calculate(8)
+        for day in days:
+            self.assertEqual(day['slots'], availability.calculate_available_times(self.employee, self.service, day['date']))
+
+
+class ServiceAvailabilityTests(BookingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = Employee.objects.create(business=self.business, role=self.role, first_name='D', last_name='E', patronymic='F')
+        self.other.service.set([self.service])
+        EmployeeWorkSchedule.objects.create(employee=self.other, workday=availability.get_workday(self.date), start_time=time(10), end_time=time(11))
+        self.create_order(10)
+
+    def test_slots(self):
+        with self.assertNumQueries(4):
+            slots = availability.calculate_service_available_times(self.service, self.date)
+        self.assertEqual([(slot['start_time'], slot['employees']) for slot in slots], [
+            ('09:00', [self.employee.pk]),
+            ('09:30', [self.employee.pk]),
+            ('10:00', [self.other.pk]),
+            ('10:30', [self.employee.pk, self.other.pk]),
+            ('11:00', [self.employee.pk]),
+            ('11:30', [self.employee.pk]),
+        ])
+        # Cached slot maps, only the employees and the holds are read
+        with self.assertNumQueries(2):
+            self.assertEqual(availability.calculate_service_available_times(self.service, self.date), slots)
+
+    def test_query_count_does_not_grow_with_employees(self):
+        third = Employee.objects.create(business=self.business, role=self.role, first_name='G', last_name='H', patronymic='I')
+        third.service.set([self.service])
+        with self.assertNumQueries(4):
+            availability.calculate_service_available_times(self.service, self.date)
+
+    def test_default_date_is_local(self):
+        # 01:30 in Tashkent is still the previous day in UTC
+        now = self.at(1, 30).astimezone(dt_timezone.utc)
+        self.assertNotEqual(now.date(), self.date)
+        path = f'/app/business/{self.business.pk}/service/{self.service.pk}/available/'
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            response = self.client.get(path)
+            self.assertEqual(len(response.data), 6)
+            self.assertEqual(response.data[0]['start_time'], '09:00')
+            response = self.client.get(path, {'date': str(self.date - timedelta(days=1))})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(path, {'date': 'tomorrow'}).status_code, 400)
+
+
+class NextAvailableTests(BookingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Tomorrow's midnight, the employee works from 09:00 on that weekday only
+        self.now = self.at(0)
+
+    def find(self, now=None):
+        return availability.find_next_available([self.employee], self.service, now=now or self.now)
+
+    def fill(self, date):
+        for hour in (9, 10, 11):
+            for minute in (0, 30):
+                start_time = timezone.make_aware(datetime.combine(date, time(hour, minute)), timezone.get_current_timezone())
+                Order.objects.create(
+                    user=self.client_user, business=self.business, employee=self.employee, service=self.service,
+                    start_time=start_time, end_time=start_time + timedelta(minutes=30),
+                )
+
+    def test_first_slot(self):
+        # Schedules, then the orders and holds of the first window
+        with self.assertNumQueries(3):
+            slot = self.find(self.now - timedelta(days=3))
+        self.assertEqual(slot, {'date': self.date, 'start_time': '09:00', 'end_time': '09:30', 'employees': [self.employee.pk]})
+        self.assertEqual(self.find(self.at(10, 10))['start_time'], '10:30')
+
+    def test_later_window(self):
+        self.fill(self.date)
+        with self.assertNumQueries(5):
+            slot = self.find()
+        self.assertEqual((slot['date'], slot['start_time']), (self.date + timedelta(days=7), '09:00'))
+
+    def test_slot_hold(self):
+        hold = SlotHold.objects.create(
+            user=self.user, employee=self.employee, service=self.service,
+            start_time=self.at(9), end_time=self.at(9, 30), expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertEqual(self.find()['start_time'], '09:30')
+        hold.expires_at = timezone.now() - timedelta(seconds=1)
+        hold.save()
+        self.assertEqual(self.find()['start_time'], '09:00')
+
+    def test_nothing_within_horizon(self):
+        self.fill(self.date)
+        with mock.patch.object(availability, 'NEXT_AVAILABLE_HORIZON_DAYS', 7):
+            self.assertIsNone(self.find())
+        EmployeeWorkSchedule.objects.all().delete()
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.find())
+
+    def test_endpoint(self):
+        self.fill(self.date)
+        response = self.client.get(
+            f'/app/business/{self.business.pk}/service/{self.service.pk}/employee/{self.employee.pk}/next-available/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['date'], response.data['start_time']), (str(self.date + timedelta(days=7)), '09:00'))
+
+
+class TempMediaMixin:
+    """Stores the files of each test in a temporary ``MEDIA_ROOT``."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class ImageVariantTests(TempMediaMixin, BookingTestCase):
+
+    def test_render_variants(self):
+        with mock.patch.object(images, '_executor') as executor, self.captureOnCommitCallbacks(execute=True):
+            business = Business.objects.create(
+                creator=self.user, business_type=self.business.business_type, name='Logo', description='',
+                logo=placeholder_image('businesses/logos/logo.png', (1200, 900)), latitude=0, longitude=0,
+            )
+        (task, *args), kwargs = executor.submit.call_args
+        self.assertEqual(args, [Business, business.pk, 'businesses/logos/logo.png'])
+        # The worker closes its connection, which would end the test transaction
+        with mock.patch.object(images, 'connection'):
+            task(*args)
+
+        business.refresh_from_db()
+        for field, size in (('logo_thumbnail', (200, 150)), ('logo_medium', (800, 600))):
+            with getattr(business, field).open('rb') as file, Image.open(file) as image:
+                self.assertEqual(image.size, size)
+        response = self.client.get(f'/app/business/{business.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['logo_thumbnail'].endswith(business.logo_thumbnail.url))
+        self.assertTrue(response.data['logo_medium'].endswith(business.logo_medium.url))
+
+    def test_missing_source(self):
+        business = Business.objects.create(
+            creator=self.user, business_type=self.business.business_type, name='Logo', description='',
+            logo='businesses/logos/missing.png', latitude=0, longitude=0,
+        )
+        with mock.patch.object(images, 'connection'), self.assertLogs('App.images', 'ERROR'):
+            images.process(Business, business.pk, 'businesses/logos/missing.png')
+        business.refresh_from_db()
+        self.assertFalse(business.logo_thumbnail)
+
+
+class OrderDayTests(BookingTestCase):
+
+    def test_default_to_local_date(self):
+        self.create_order(10)
+        # 19:30 UTC on the previous day is already self.date in Tashkent
+        now = self.at(0, 30).astimezone(dt_timezone.utc)
+        self.assertNotEqual(now.date(), self.date)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            response = self.client.get(f'/app/business/employee/{self.employee.pk}/order/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+
+class BulkCreateTests(BookingTestCase):
+
+    def test_invalidates_like_post_save(self):
+        availability.calculate_available_times(self.employee, self.service, self.date)
+        before = response_cache.get_versions([self.business.pk])
+        signals.bulk_create(Order, [
+            Order(user=self.client_user, business=self.business, employee=self.employee, service=self.service,
+                  start_time=self.at(hour), end_time=self.at(hour, 30))
+            for hour in (9, 10)
+        ])
+        slots = availability.calculate_available_times(self.employee, self.service, self.date)
+        self.assertNotIn({"start_time": "09:00", "end_time": "09:30"}, slots)
+
+        signals.bulk_create(EmployeeWorkSchedule, [
+            EmployeeWorkSchedule(employee=self.employee, workday=availability.get_workday(self.date), start_time=time(14), end_time=time(15)),
+        ])
+        self.assertNotEqual(response_cache.get_versions([self.business.pk]), before)
+        slots = availability.calculate_available_times(self.employee, self.service, self.date)
+        self.assertIn({"start_time": "14:30", "end_time": "15:00"}, slots)
+
+        with mock.patch.object(images, 'schedule') as schedule:
+            image, = signals.bulk_create(BusinessImage, [BusinessImage(business=self.business, image='businesses/images/a.png')])
+        schedule.assert_called_once_with(image)
+
+    def test_unknown_model(self):
+        with self.assertRaises(ValueError):
+            signals.bulk_create(Service, [])
+
+
+class WorkScheduleUpdateTests(BookingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.workday = availability.get_workday(self.date)
+        self.kept = self.employee.work_schedules.get()
+        self.other_days = [availability.get_workday(self.date + timedelta(days=days)) for days in range(1, 5)]
+        for workday in self.other_days:
+            EmployeeWorkSchedule.objects.create(employee=self.employee, workday=workday, start_time=time(9), end_time=time(12))
+
+    def update(self, schedules):
+        serializer = EmployeeSerializer(
+            self.employee, data={'work_schedules': schedules}, partial=True, context={'business': self.business},
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def stored(self):
+        return set(self.employee.work_schedules.values_list('workday', 'start_time', 'end_time'))
+
+    def test_keep_update_delete(self):
+        schedules = [
+            {'workday': self.workday, 'start_time': '09:00', 'end_time': '12:00'},
+            {'workday': self.other_days[0], 'start_time': '10:00', 'end_time': '13:00'},
+        ]
+        self.update(schedules)
+        self.assertEqual(self.stored(), {(self.workday, time(9), time(12)), (self.other_days[0], time(10), time(13))})
+        self.assertTrue(EmployeeWorkSchedule.objects.filter(pk=self.kept.pk).exists())
+
+    def test_unchanged_runs_no_writes(self):
+        schedules = [{'workday': self.workday, 'start_time': '09:00', 'end_time': '12:00'}] + [
+            {'workday': workday, 'start_time': '09:00', 'end_time': '12:00'} for workday in self.other_days
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            self.update(schedules)
+        self.assertFalse([query for query in queries if query['sql'].startswith(('INSERT', 'DELETE', 'UPDATE "App_employeeworkschedule"'))])
+        self.assertEqual(self.employee.work_schedules.count(), 5)
+
+    def test_query_count_is_bounded(self):
+        serializer = EmployeeSerializer(context={'business': self.business})
+        with CaptureQueriesContext(connection) as one:
+            serializer.update_work_schedules(self.employee, [
+                {'workday': workday, 'start_time': time(9), 'end_time': time(12)} for workday in [self.workday] + self.other_days[1:]
+            ] + [{'workday': self.other_days[0], 'start_time': time(13), 'end_time': time(14)}])
+        with CaptureQueriesContext(connection) as all_:
+            serializer.update_work_schedules(self.employee, [
+                {'workday': workday, 'start_time': time(15), 'end_time': time(16)} for workday in [self.workday] + self.other_days
+            ])
+        self.assertEqual(len(all_), len(one))
+        self.assertEqual(self.employee.work_schedules.count(), 5)
+
+
+class BusinessImageUpdateTests(TempMediaMixin, BookingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.images = [
+            BusinessImage.objects.create(business=self.business, image=placeholder_image(f'businesses/images/{i}.png'), position=i)
+            for i in range(3)
+        ]
+        self.path = f'/app/business/{self.business.pk}/'
+
+    def patch(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(self.path, data, format='multipart')
+        file_deletion.flush()
+        return response
+
+    def stored(self):
+        return list(self.business.images.order_by('position').values_list('pk', flat=True))
+
+    def test_keep_without_image_ids(self):
+        self.assertEqual(self.patch({'name': 'Renamed'}).status_code, 200)
+        self.assertEqual(self.stored(), [image.pk for image in self.images])
+
+    def test_reorder(self):
+        order = [self.images[2].pk, self.images[0].pk, self.images[1].pk]
+        response = self.patch({'image_ids': order})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stored(), order)
+        self.assertEqual([image['id'] for image in response.data['images']], order)
+
+    def test_remove_deletes_files(self):
+        kept, *removed = self.images
+        self.assertEqual(self.patch({'image_ids': [kept.pk]}).status_code, 200)
+        self.assertEqual(self.stored(), [kept.pk])
+        self.assertTrue(default_storage.exists(kept.image.name))
+        for image in removed:
+            self.assertFalse(default_storage.exists(image.image.name))
+
+    def test_empty_marker_removes_all(self):
+        self.assertEqual(self.patch({'image_ids': ''}).status_code, 200)
+        self.assertEqual(self.stored(), [])
+        self.assertEqual(self.patch({'image_ids': []}).status_code, 200)
+
+    def test_unknown_and_duplicate_ids(self):
+        other = Business.objects.create(
+            creator=self.user, business_type=self.business.business_type, name='Other', description='',
+            logo='businesses/logos/other.png', latitude=0, longitude=0,
+        )
+        foreign = BusinessImage.objects.create(business=other, image='businesses/images/foreign.png')
+        self.assertEqual(self.patch({'image_ids': [foreign.pk]}).status_code, 400)
+        self.assertEqual(self.patch({'image_ids': [self.images[0].pk] * 2}).status_code, 400)
+        self.assertEqual(self.stored(), [image.pk for image in self.images])
+
+
+class LookupTests(BookingTestCase):
+
+    def business_selects(self, queries):
+        return [query for query in queries if query['sql'].startswith('SELECT') and 'FROM "App_business"' in query['sql']]
+
+    def test_memoized_per_request(self):
+        request = mock.Mock(spec=[])
+        with self.assertNumQueries(1):
+            employee = lookups.get_employee(request, self.employee.pk)
+            self.assertIs(lookups.get_employee(request, str(self.employee.pk)), employee)
+            self.assertIs(lookups.get_business(request, self.business.pk), employee.business)
+        with self.assertNumQueries(1):
+            self.assertIsNone(lookups.get_business(request, 0))
+            self.assertIsNone(lookups.get_business(request, 0))
+
+    def test_employee_create_loads_business_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/app/business/{self.business.pk}/service/{self.service.pk}/employee/', {
+                'role_id': self.role.pk, 'first_name': 'D', 'last_name': 'E', 'patronymic': 'F',
+                'service': [self.service.pk],
+                'work_schedules': [{'workday': 'MON', 'start_time': '09:00', 'end_time': '12:00'}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(self.business_selects(queries)), 1)
+
+    def test_order_create_loads_employee_once(self):
+        self.client.force_authenticate(self.client_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/app/user/employee/{self.employee.pk}/order/', {
+                'service': self.service.pk, 'start_time': self.local(9), 'end_time': self.local(9, 30),
+            })
+        self.assertEqual(response.status_code, 201, response.data)
+        employee_selects = [query for query in queries if query['sql'].startswith('SELECT') and 'FROM "App_employee" ' in query['sql']]
+        self.assertEqual(len(employee_selects), 1)
+        self.assertEqual(len(self.business_selects(queries)), 0)
+
+
+class ServiceTreeTests(BookingTestCase):
+
+    def test_tree_in_one_query(self):
+        names = {name: ServiceName.objects.create(business_type=self.business.business_type, name=name) for name in ('Cut', 'Kids', 'Beard')}
+        cut = Service.objects.create(business=self.business, service_name=names['Cut'], parent=self.service, duration=timedelta(minutes=20))
+        Service.objects.create(business=self.business, service_name=names['Kids'], parent=cut, duration=timedelta(minutes=15))
+        Service.objects.create(business=self.business, service_name=names['Beard'], duration=timedelta(minutes=10))
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/app/business/{self.business.pk}/service/', {'tree': 1})
+        self.assertEqual(response.status_code, 200)
+
+        def shape(nodes):
+            return [(node['service_name'], shape(node['subservices'])) for node in nodes]
+        self.assertEqual(shape(response.data), [('Haircut', [('Cut', [('Kids', [])])]), ('Beard', [])])
+
+    def test_unknown_business(self):
+        response = self.client.get('/app/business/0/service/', {'tree': 1})
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryInstrumentationTests(BookingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset_stats()
+        self.addCleanup(instrumentation.reset_stats)
+
+    def run_middleware(self, queries):
+        def view(request):
+            for business_id in range(queries):
+                Business.objects.filter(pk=business_id).first()
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(view_name='test-view')
+        return instrumentation.QueryInstrumentationMiddleware(view)(request)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            instrumentation.fingerprint('SELECT  *\n FROM t WHERE id IN (%s, %s, %s)'),
+            instrumentation.fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+    @override_settings(QUERY_N_PLUS_ONE_THRESHOLD=5, DEBUG=True)
+    def test_flags_repeated_shape_above_threshold(self):
+        with self.assertLogs('equeue.queries', 'INFO') as logs:
+            response = self.run_middleware(5)
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual((response['X-Query-Count'], response['X-Query-Repeated'], response['X-Query-N-Plus-One']), ('5', '4', '0'))
+
+        with self.assertLogs('equeue.queries', 'WARNING') as logs:
+            response = self.run_middleware(6)
+        (shape, count), = json.loads(logs.records[0].getMessage())['n_plus_one'].items()
+        self.assertIn('FROM "App_business"', shape)
+        self.assertEqual(count, 6)
+        self.assertEqual(response['X-Query-N-Plus-One'], '1')
+
+        stats = instrumentation.get_stats()['test-view']
+        self.assertEqual((stats['requests'], stats['max_queries'], stats['n_plus_one_requests']), (2, 6, 1))
+        self.assertEqual(list(stats['n_plus_one_queries'].values()), [6])
+
+    def test_stats_view(self):
+        with self.assertLogs('equeue.queries'):
+            self.client.get(f'/app/business/{self.business.pk}/')
+        self.assertEqual(self.client.get('/debug/queries/').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/debug/queries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['business-detail']['requests'], 1)
+        self.assertEqual(self.client.delete('/debug/queries/').status_code, 204)
+        self.assertNotIn('business-detail', self.client.get('/debug/queries/').data)
+
+
+class FileDeletionTests(TempMediaMixin, BookingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.image = BusinessImage.objects.create(business=self.business, image=placeholder_image('businesses/images/a.png'))
+
+    def test_deleted_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.image.delete()
+        self.assertTrue(default_storage.exists('businesses/images/a.png'))
+        for callback in callbacks:
+            callback()
+        file_deletion.flush()
+        self.assertFalse(default_storage.exists('businesses/images/a.png'))
+
+    def test_kept_on_rollback(self):
+        pk = self.image.pk
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.image.delete()
+                raise RuntimeError
+        file_deletion.flush()
+        self.assertEqual(callbacks, [])
+        self.assertTrue(BusinessImage.objects.filter(pk=pk).exists())
+        self.assertTrue(default_storage.exists('businesses/images/a.png'))
+
+
+class ReconcileMediaTests(TempMediaMixin, BookingTestCase):
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_media', *args, stdout=out)
+        return out.getvalue().splitlines()
+
+    def test_lists_unreferenced_files(self):
+        BusinessImage.objects.create(business=self.business, image=placeholder_image('businesses/images/kept.png'))
+        orphan = placeholder_image('businesses/images/orphan.png')
+
+        self.assertEqual(self.reconcile()[-1], 'Found 0 orphaned files, 2 files are referenced.')
+        lines = self.reconcile('--min-age', '0')
+        self.assertEqual(lines, [default_storage.path(orphan), 'Found 1 orphaned files, 2 files are referenced.'])
+
+        self.reconcile('--min-age', '0', '--delete')
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists('businesses/images/kept.png'))
+
+
+class NearestTests(BookingTestCase):
+
+    def add(self, name, latitude, longitude):
+        return Business.objects.create(
+            creator=self.user, business_type=self.business.business_type, name=name, description='',
+            logo='businesses/logos/geo.png', latitude=latitude, longitude=longitude,
+        )
+
+    def test_nearest_first_within_radius(self):
+        origin = (41.0, 69.0)
+        # ~1 km east, ~2 km north, ~3.5 km diagonally: inside the box but outside 3 km
+        east = self.add('East', 41.0, 69.0119)
+        north = self.add('North', 41.018, 69.0)
+        self.add('Corner', 41.0225, 69.0297)
+        self.add('Far', 42.0, 69.0)
+        self.assertLess(3, geo.haversine_km(*origin, 41.0225, 69.0297))
+
+        with self.assertNumQueries(2):
+            found = geo.nearest(Business.objects.all(), *origin, 3, 10)
+        self.assertEqual([business.pk for business in found], [east.pk, north.pk])
+        self.assertAlmostEqual(found[0].distance, geo.haversine_km(*origin, 41.0, 69.0119))
+        self.assertEqual([business.pk for business in geo.nearest(Business.objects.all(), *origin, 3, 1)], [east.pk])
+
+    def test_box_edge(self):
+        # Just inside and just outside the radius, straight north and east
+        radius = 5
+        delta_lat = math.degrees(radius / geo.EARTH_RADIUS_KM)
+        inside = self.add('Inside', 41.0 + delta_lat * 0.999, 69.0)
+        self.add('Outside', 41.0 + delta_lat * 1.001, 69.0)
+        delta_lon = delta_lat / math.cos(math.radians(41.0))
+        east = self.add('East', 41.0, 69.0 + delta_lon * 0.999)
+        found = geo.nearest(Business.objects.all(), 41.0, 69.0, radius, 10)
+        self.assertEqual({business.pk for business in found}, {inside.pk, east.pk})
+
+    def test_antimeridian(self):
+        west = self.add('West', 0.0, 179.99)
+        east = self.add('East', 0.0, -179.98)
+        found = geo.nearest(Business.objects.all(), 0.0, 179.995, 10, 10)
+        self.assertEqual([business.pk for business in found], [west.pk, east.pk])
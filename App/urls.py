@@ -1,16 +1,30 @@
 from django.urls import path
 from .views import *
+from . import async_views
 
 
 urlpatterns = [
     path('type/', BusinessTypeListView.as_view(), name='businesstype'),
     path('business/', BusinessListCreateView.as_view(), name='business'),
+    path('search/', SearchView.as_view(), name='search'),
     path('business/<int:business_pk>/', BusinessDetailView.as_view(), name='business-detail'),
     path('business/<int:business_pk>/service/', ServiceListCreateView.as_view(), name='service'),
     path('business/<int:business_pk>/service/<int:service_pk>/', SubServiceListAPIView.as_view(), name='subservice'),
+    path('business/<int:business_pk>/service/<int:service_pk>/available/', ServiceAvailableTimeView.as_view(), name='service-available'),
+    path('business/<int:business_pk>/service/<int:service_pk>/next-available/', NextAvailableTimeView.as_view(), name='service-next-available'),
     path('business/<int:business_pk>/service/<int:service_pk>/employee/', EmployeeListCreateView.as_view(), name='employee'),
     path('business/<int:business_pk>/service/<int:service_pk>/employee/<int:employee_pk>/', EmployeeDetailView.as_view(), name='employee-detail'),
     path('business/<int:business_pk>/service/<int:service_pk>/employee/<int:employee_pk>/evailabe/', AvailableTimeView.as_view(), name='available'),
+    path('business/<int:business_pk>/service/<int:service_pk>/employee/<int:employee_pk>/next-available/', NextAvailableTimeView.as_view(), name='next-available'),
+    path('business/<int:business_pk>/order/bulk/', BulkOrderCreateView.as_view(), name='business-order-bulk'),
     path('business/employee/<int:employee_pk>/order/', BusinessOrdersListView.as_view(), name='business-order'),
     path('user/employee/<int:employee_pk>/order/', OrderListCreateView.as_view(), name='order'),
+    path('user/employee/<int:employee_pk>/hold/', SlotHoldCreateView.as_view(), name='hold'),
+    path('user/hold/<int:hold_pk>/', SlotHoldDetailView.as_view(), name='hold-detail'),
+    path('user/hold/<int:hold_pk>/confirm/', SlotHoldConfirmView.as_view(), name='hold-confirm'),
+    path('async/business/', async_views.AsyncBusinessListView.as_view(), name='async-business'),
+    path('async/business/<int:business_pk>/service/<int:service_pk>/employee/<int:employee_pk>/evailabe/', async_views.AsyncAvailableTimeView.as_view(), name='async-available'),
+    path('async/business/employee/<int:employee_pk>/order/', async_views.AsyncBusinessOrdersListView.as_view(), name='async-business-order'),
+    path('async/user/employee/<int:employee_pk>/order/', async_views.AsyncOrderListView.as_view(), name='async-order'),
+    path('availability/cache-stats/', AvailabilityCacheStatsView.as_view(), name='availability-cache-stats'),
 ]
\ No newline at end of file
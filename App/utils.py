@@ -0,0 +1,18 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def day_bounds(date_from, date_to=None):
+    """
+    Half-open ``[start, end)`` aware datetimes covering ``date_from`` up to
+    and including ``date_to`` in the current timezone.
+
+    Filter with ``start_time__gte=start, start_time__lt=end`` instead of
+    ``start_time__date=date``: the ``__date`` lookup wraps the column in a
+    timezone converting cast, which no index on the column can serve.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(date_from, time.min), tz)
+    end = timezone.make_aware(datetime.combine((date_to or date_from) + timedelta(days=1), time.min), tz)
+    return start, end
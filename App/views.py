@@ -1,32 +1,128 @@
 # from django.utils import timezone
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from django.shortcuts import render
 from django.shortcuts import get_object_or_404
-from rest_framework import generics, permissions, serializers, response, views, status
+from django.http import Http404
+from django.db import transaction
+from rest_framework import exceptions, generics, mixins, permissions, serializers, response, views, status
 
 from .models import *
 from .serializers import *
 from .permissions import *
+from .pagination import BusinessCursorPagination
+from .response_cache import CATALOG, CachedResponseMixin
+from . import availability, availability_cache, geo, search
+from .booking import bulk_create_orders, lock_employee
+from .lookups import get_business, get_employee
+from .utils import day_bounds
 
+BULK_ORDER_LIMIT = 200
 
-class BusinessTypeListView(generics.ListAPIView):
+
+class BusinessTypeListView(CachedResponseMixin, generics.ListAPIView):
     queryset = BusinessType.objects.all()
     serializer_class = BusinessTypeSerializer
 
+    def get_cache_scopes(self):
+        return [CATALOG]
+
 
-class BusinessListCreateView(generics.ListCreateAPIView):
+class BusinessListMixin(mixins.ListModelMixin):
+    """
+    The business list: cursor paginated, or the nearest businesses with
+    ``lat``/``lon``. Shared by ``BusinessListCreateView`` and its async
+    counterpart, so both answer the same parameters the same way.
+    """
     serializer_class = BusinessSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    
+    pagination_class = BusinessCursorPagination
+
     def get_queryset(self):
+        businesses = Business.objects.select_related('business_type').prefetch_related('images')
         type_id = self.request.query_params.get('type_id')
         if type_id:
-            return Business.objects.filter(business_type__pk=type_id)
+            return businesses.filter(business_type__pk=type_id)
         else:
-            return Business.objects.all()
+            return businesses
+
+    def list(self, request, *args, **kwargs):
+        if 'lat' in request.query_params or 'lon' in request.query_params:
+            return self.list_nearby(request)
+        return super().list(request, *args, **kwargs)
+
+    def list_nearby(self, request):
+        """
+        Businesses within ``radius`` km of ``lat``/``lon``, nearest first and
+        at most ``limit`` of them. Not paginated.
+        """
+        businesses = geo.nearest(self.get_queryset(), *self.get_nearby_params(request))
+        return self.nearby_response(businesses)
+
+    def get_nearby_params(self, request):
+        params = request.query_params
+        try:
+            lat = float(params['lat'])
+            lon = float(params['lon'])
+        except (KeyError, ValueError):
+            raise serializers.ValidationError({"detail": "Both lat and lon must be numbers."})
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise serializers.ValidationError({"detail": "lat must be within [-90, 90] and lon within [-180, 180]."})
+        try:
+            radius = float(params.get('radius', geo.DEFAULT_RADIUS_KM))
+            limit = int(params.get('limit', geo.DEFAULT_LIMIT))
+        except ValueError:
+            raise serializers.ValidationError({"detail": "radius and limit must be numbers."})
+        if not (0 < radius <= geo.MAX_RADIUS_KM):
+            raise serializers.ValidationError({"radius": f"Radius must be greater than 0 and at most {geo.MAX_RADIUS_KM} km."})
+        if not (0 < limit <= geo.MAX_LIMIT):
+            raise serializers.ValidationError({"limit": f"Limit must be between 1 and {geo.MAX_LIMIT}."})
+
+        return lat, lon, radius, limit
+
+    def nearby_response(self, businesses):
+        serializer = NearbyBusinessSerializer(businesses, many=True, context=self.get_serializer_context())
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class BusinessListCreateView(BusinessListMixin, generics.ListCreateAPIView):
+    pass
+
+
+class SearchView(views.APIView):
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise serializers.ValidationError({"q": "Search query is required."})
+        try:
+            limit = int(request.query_params.get('limit', search.DEFAULT_LIMIT))
+        except ValueError:
+            raise serializers.ValidationError({"limit": "Limit must be a number."})
+        if not (0 < limit <= search.MAX_LIMIT):
+            raise serializers.ValidationError({"limit": f"Limit must be between 1 and {search.MAX_LIMIT}."})
 
+        try:
+            results = search.search(query, limit)
+        except search.IndexNotReady:
+            return response.Response(
+                {"detail": "Search is starting up, try again shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "5"},
+            )
+        businesses = Business.objects.select_related('business_type').prefetch_related('images').in_bulk(
+            [business_id for score, business_id in results]
+        )
+        found = []
+        # The index of another process may still hold a business deleted here
+        for score, business_id in results:
+            if business_id in businesses:
+                businesses[business_id].score = score
+                found.append(businesses[business_id])
+
+        serializer = SearchResultSerializer(found, many=True, context={'request': request})
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
 
-class BusinessDetailView(generics.RetrieveUpdateDestroyAPIView):
+
+class BusinessDetailView(CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = BusinessSerializer
 
     def get_object(self):
@@ -34,54 +130,104 @@ class BusinessDetailView(generics.RetrieveUpdateDestroyAPIView):
         return get_object_or_404(Business, pk=business_pk)
 
 
-class BusinessOrdersListView(generics.ListAPIView):
+class OrderDayMixin:
+    """The orders of one employee on the ``date`` query parameter, today by default."""
     serializer_class = OrderSerializer
-    permission_classes = [IsBusinessCreator]
 
-    def get_queryset(self):
-        employee_pk = self.kwargs['employee_pk']
+    def get_day_bounds(self):
         date_str = self.request.query_params.get('date')
         
         if date_str:
             try:
                 date = timezone.datetime.strptime(date_str, "%Y-%m-%d").date()
             except ValueError:
-                raise ValidationError({"date": "Date format should be YYYY-MM-DD"})
+                raise serializers.ValidationError({"date": "Date format should be YYYY-MM-DD"})
         else:
-            date = timezone.now().date()
-            
+            date = timezone.localdate()
+
+        return day_bounds(date)
+
+
+class BusinessOrderListMixin(OrderDayMixin):
+    permission_classes = [IsBusinessCreator]
+
+    def get_queryset(self):
+        employee_pk = self.kwargs['employee_pk']
+        day_start, day_end = self.get_day_bounds()
+        return Order.objects.filter(
+            employee__pk=employee_pk,
+            start_time__gte=day_start,
+            start_time__lt=day_end,
+        )
+
+
+class UserOrderListMixin(OrderDayMixin):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        employee_pk = self.kwargs['employee_pk']
+        day_start, day_end = self.get_day_bounds()
         return Order.objects.filter(
+            user=self.request.user,
             employee__pk=employee_pk,
-            start_time__date=date
+            start_time__gte=day_start,
+            start_time__lt=day_end,
         )
 
 
-class ServiceListCreateView(generics.ListCreateAPIView):
+class BusinessOrdersListView(BusinessOrderListMixin, generics.ListAPIView):
+    pass
+
+
+class ServiceListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
     serializer_class = ServiceSerializer
     permission_classes = [IsBusinessCreatorOrReadOnly]
 
     def get_queryset(self):
         business_pk = self.kwargs['business_pk']
-        return Service.objects.filter(business__pk=business_pk, parent__isnull=True)
+        return Service.objects.filter(business__pk=business_pk, parent__isnull=True).select_related('service_name')
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('tree') in ('1', 'true'):
+            return self.list_tree(request)
+        return super().list(request, *args, **kwargs)
+
+    def list_tree(self, request):
+        """
+        All services of the business nested under their parents, loaded in
+        one query and assembled in memory.
+        """
+        business_pk = self.kwargs['business_pk']
+        services = list(Service.objects.filter(business_id=business_pk).select_related('service_name').order_by('pk'))
+        if not services and not Business.objects.filter(pk=business_pk).exists():
+            raise serializers.ValidationError({"business": f"Business with ID {business_pk} does not exist."})
+
+        children = {}
+        for service in services:
+            children.setdefault(service.parent_id, []).append(service)
+        for service in services:
+            service.children = children.get(service.pk, [])
+
+        serializer = ServiceTreeSerializer(children.get(None, []), many=True)
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
         business_pk = self.kwargs['business_pk']
-        try:
-            business = Business.objects.get(pk=business_pk)
-        except Business.DoesNotExist:
+        business = get_business(self.request, business_pk)
+        if business is None:
             raise serializers.ValidationError({"business": f"Business with ID {business_pk} does not exist."})
         context['business'] = business
         return context
 
 
-class SubServiceListAPIView(generics.ListAPIView):
+class SubServiceListAPIView(CachedResponseMixin, generics.ListAPIView):
     serializer_class = ServiceSerializer
 
     def get_queryset(self):
         business_pk = self.kwargs['business_pk']
         service_pk = self.kwargs['service_pk']
-        services = Service.objects.filter(business_id=business_pk, parent_id=service_pk)
+        services = Service.objects.filter(business_id=business_pk, parent_id=service_pk).select_related('service_name')
         if not services.exists():
             raise serializers.ValidationError({"service": f"Service with ID {service_pk} does not have subservices."})
         return services
@@ -98,9 +244,8 @@ class EmployeeListCreateView(generics.ListCreateAPIView):
     def get_serializer_context(self):
         context = super().get_serializer_context()
         business_pk = self.kwargs['business_pk']
-        try:
-            business = Business.objects.get(pk=business_pk)
-        except Business.DoesNotExist:
+        business = get_business(self.request, business_pk)
+        if business is None:
             raise serializers.ValidationError({"business": f"Business with ID {business_pk} does not exist."})
         context['business'] = business
         context['request'] = self.request
@@ -118,119 +263,315 @@ class EmployeeDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_object(self):
         business_pk = self.kwargs['business_pk']
         employee_pk = self.kwargs['employee_pk']
-        return get_object_or_404(Employee, business__pk=business_pk, pk=employee_pk)
+        employee = get_employee(self.request, employee_pk)
+        if employee is None or employee.business_id != business_pk:
+            raise Http404
+        return employee
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
         business_pk = self.kwargs['business_pk']
-        try:
-            business = Business.objects.get(pk=business_pk)
-        except Business.DoesNotExist:
+        business = get_business(self.request, business_pk)
+        if business is None:
             raise serializers.ValidationError({"business": f"Business with ID {business_pk} does not exist."})
         context['business'] = business
         return context
 
 
-class OrderListCreateView(generics.ListCreateAPIView):
-    serializer_class = OrderSerializer
-    permission_classes = [permissions.IsAuthenticated]
+class OrderListCreateView(UserOrderListMixin, generics.ListCreateAPIView):
 
-    def get_queryset(self):
-        employee_pk = self.kwargs['employee_pk']
-        date_str = self.request.query_params.get('date')
-        
-        if date_str:
-            try:
-                date = timezone.datetime.strptime(date_str, "%Y-%m-%d").date()
-            except ValueError:
-                raise ValidationError({"date": "Date format should be YYYY-MM-DD"})
-        else:
-            date = timezone.now().date()
-            
-        return Order.objects.filter(
-            user=self.request.user,
-            employee__pk=employee_pk,
-            start_time__date=date,
-        )
-    
     def get_serializer_context(self):
         context = super().get_serializer_context()
         user = self.request.user
         employee_pk = self.kwargs['employee_pk']
-        try:
-            employee = Employee.objects.get(pk=employee_pk)
-            business = employee.business
-        except Employee.DoesNotExist:
+        employee = get_employee(self.request, employee_pk)
+        if employee is None:
             raise serializers.ValidationError({"employee": "Employee does not exist."})
+        business = employee.business
         context['business'] = business
         context['employee'] = employee
         context['user'] = user
         return context
 
 
-class AvailableTimeView(generics.GenericAPIView):
+class BulkOrderCreateView(generics.GenericAPIView):
+    serializer_class = BulkOrderItemSerializer
+    permission_classes = [permissions.IsAuthenticated, IsBusinessCreatorOrReadOnly]
+
+    def post(self, request, *args, **kwargs):
+        business_pk = self.kwargs['business_pk']
+        business = get_business(request, business_pk)
+        if business is None:
+            raise Http404
+
+        if not isinstance(request.data, list):
+            return response.Response({"detail": "Expected a list of orders."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > BULK_ORDER_LIMIT:
+            return response.Response({"detail": f"At most {BULK_ORDER_LIMIT} orders can be created at once."}, status=status.HTTP_400_BAD_REQUEST)
+
+        valid = []
+        errors = {}
+        for index, item in enumerate(request.data):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, dict(serializer.validated_data)))
+            else:
+                errors[index] = serializer.errors
+
+        employees = {employee.pk: employee for employee in Employee.objects.filter(business=business)}
+        services = {service.pk: service for service in Service.objects.filter(business=business)}
+        offered = set(Employee.service.through.objects.filter(
+            employee__business=business
+        ).values_list('employee_id', 'service_id'))
+        user_ids = {data['user'] for index, data in valid if 'user' in data}
+        users = {request.user.pk: request.user}
+        if user_ids:
+            users.update((user.pk, user) for user in User.objects.filter(
+                pk__in=user_ids, is_active=True, deleted_at__isnull=True
+            ))
+
+        items = []
+        for index, data in valid:
+            data['user'] = users.get(data.get('user', request.user.pk))
+            data['employee'] = employees.get(data['employee'])
+            data['service'] = services.get(data['service'])
+            if data['user'] is None:
+                errors[index] = {"user": "User does not exist."}
+            elif data['employee'] is None:
+                errors[index] = {"employee": "Employee does not exist in this business."}
+            elif data['service'] is None:
+                errors[index] = {"service": "Service does not exist in this business."}
+            elif (data['employee'].pk, data['service'].pk) not in offered:
+                errors[index] = {"service": "The employee does not provide this service."}
+            else:
+                items.append((index, data))
+
+        orders, order_errors = bulk_create_orders(business, items)
+        errors.update(order_errors)
+
+        if not errors:
+            status_code = status.HTTP_201_CREATED
+        elif not orders:
+            status_code = status.HTTP_400_BAD_REQUEST
+        else:
+            status_code = status.HTTP_207_MULTI_STATUS
+
+        return response.Response({
+            "created": OrderSerializer(orders, many=True).data,
+            "errors": [{"index": index, "errors": errors[index]} for index in sorted(errors)],
+        }, status=status_code)
+
+
+class SlotHoldCreateView(generics.CreateAPIView):
+    serializer_class = SlotHoldSerializer
     permission_classes = [permissions.IsAuthenticated]
-    serializer_class = AvailableTimeSerializer
 
-    def get(self, request, *args, **kwargs):
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
         employee_pk = self.kwargs['employee_pk']
-        service_pk = self.kwargs['service_pk']
+        employee = get_employee(self.request, employee_pk)
+        if employee is None:
+            raise serializers.ValidationError({"employee": "Employee does not exist."})
+        context['employee'] = employee
+        context['user'] = self.request.user
+        return context
 
-        today = datetime.now()
 
-        date = request.query_params.get('date')
-        
-        if date is None:
-            date = today.date().strftime('%Y-%m-%d')
-        elif date < today.date().strftime('%Y-%m-%d'):
-            return response.Response({"detail": "Date must be today or in the future."}, status=status.HTTP_400_BAD_REQUEST)
+class SlotHoldDetailView(generics.RetrieveDestroyAPIView):
+    serializer_class = SlotHoldSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        hold_pk = self.kwargs['hold_pk']
+        return get_object_or_404(SlotHold, pk=hold_pk, user=self.request.user)
+
 
+class SlotHoldConfirmView(generics.GenericAPIView):
+    serializer_class = OrderSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        hold_pk = self.kwargs['hold_pk']
+        try:
+            hold = SlotHold.objects.select_related('employee', 'service').get(pk=hold_pk, user=request.user)
+        except SlotHold.DoesNotExist:
+            return response.Response({"detail": "Hold not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        with transaction.atomic():
+            lock_employee(hold.employee_id)
+
+            # Confirming and releasing the same hold race for this delete
+            if not SlotHold.objects.filter(pk=hold.pk).delete()[0]:
+                return response.Response({"detail": "Hold not found."}, status=status.HTTP_404_NOT_FOUND)
+            if hold.expires_at <= timezone.now():
+                return response.Response({"detail": "The hold has expired."}, status=status.HTTP_400_BAD_REQUEST)
+            # The schedule or the durations may have changed since the hold was taken
+            serializer = self.get_serializer(context={**self.get_serializer_context(), 'employee': hold.employee, 'user': request.user})
+            try:
+                serializer.validate({
+                    'service': hold.service,
+                    'start_time': timezone.localtime(hold.start_time),
+                    'end_time': timezone.localtime(hold.end_time),
+                })
+            except serializers.ValidationError as exc:
+                return response.Response(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+            if Order.objects.filter(employee_id=hold.employee_id, start_time__lt=hold.end_time, end_time__gt=hold.start_time).exists():
+                return response.Response({"detail": "The employee is not available during the specified times."}, status=status.HTTP_400_BAD_REQUEST)
+
+            order = Order.objects.create(
+                user=request.user,
+                business_id=hold.employee.business_id,
+                employee=hold.employee,
+                service_id=hold.service_id,
+                start_time=hold.start_time,
+                end_time=hold.end_time,
+            )
+
+        serializer = self.get_serializer(order)
+        return response.Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AvailableTimeMixin:
+    """
+    Parameters and responses of the availability endpoint, shared by
+    ``AvailableTimeView`` and its async counterpart: the free slots on
+    ``date``, today by default, or per day from ``date_from`` to ``date_to``.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = AvailableTimeSerializer
+
+    def is_range(self):
+        params = self.request.query_params
+        return 'date_from' in params or 'date_to' in params
+
+    def get_date(self):
+        date = self.request.query_params.get('date')
+        if date is None:
+            return timezone.localdate()
         try:
             date = datetime.strptime(date, '%Y-%m-%d').date()
         except ValueError:
-            return response.Response({"detail": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+            raise exceptions.ParseError("Invalid date format. Use YYYY-MM-DD.")
+        if date < timezone.localdate():
+            raise exceptions.ParseError("Date must be today or in the future.")
+        return date
+
+    def get_date_range(self):
+        params = self.request.query_params
+        try:
+            date_from = datetime.strptime(params.get('date_from', ''), '%Y-%m-%d').date()
+            date_to = datetime.strptime(params.get('date_to', ''), '%Y-%m-%d').date()
+        except ValueError:
+            raise exceptions.ParseError("Both date_from and date_to are required in YYYY-MM-DD format.")
+
+        if date_from < timezone.localdate():
+            raise exceptions.ParseError("Date must be today or in the future.")
+        if date_to < date_from:
+            raise exceptions.ParseError("date_to must not be earlier than date_from.")
+        if (date_to - date_from).days >= availability.MAX_RANGE_DAYS:
+            raise exceptions.ParseError(f"The range can not be longer than {availability.MAX_RANGE_DAYS} days.")
+        return date_from, date_to
 
+    def get_employee_and_service(self):
         try:
-            employee = Employee.objects.get(pk=employee_pk)
+            employee = Employee.objects.get(pk=self.kwargs['employee_pk'])
         except Employee.DoesNotExist:
-            return response.Response({"detail": "Employee not found."}, status=status.HTTP_404_NOT_FOUND)
-        
+            raise exceptions.NotFound("Employee not found.")
         try:
-            service = Service.objects.get(pk=service_pk)
+            service = Service.objects.get(pk=self.kwargs['service_pk'])
         except Service.DoesNotExist:
-            return response.Response({"detail": "Service not found."}, status=status.HTTP_404_NOT_FOUND)
+            raise exceptions.NotFound("Service not found.")
+        return employee, service
 
-        available_times = self.calculate_available_times(employee, service, date)
+    async def aget_employee_and_service(self):
+        try:
+            employee = await Employee.objects.aget(pk=self.kwargs['employee_pk'])
+        except Employee.DoesNotExist:
+            raise exceptions.NotFound("Employee not found.")
+        try:
+            service = await Service.objects.aget(pk=self.kwargs['service_pk'])
+        except Service.DoesNotExist:
+            raise exceptions.NotFound("Service not found.")
+        return employee, service
 
+    def day_response(self, available_times):
         serializer = self.get_serializer(available_times, many=True)
         return response.Response(serializer.data, status=status.HTTP_200_OK)
 
+    def range_response(self, days):
+        serializer = AvailableDaySerializer(days, many=True)
+        summary = {day['date'].strftime('%Y-%m-%d'): bool(day['slots']) for day in days}
+        return response.Response({"days": serializer.data, "summary": summary}, status=status.HTTP_200_OK)
+
+
+class AvailableTimeView(AvailableTimeMixin, generics.GenericAPIView):
+
+    def get(self, request, *args, **kwargs):
+        if self.is_range():
+            date_from, date_to = self.get_date_range()
+            employee, service = self.get_employee_and_service()
+            days = availability.calculate_available_times_range(employee, service, date_from, date_to)
+            return self.range_response(days)
+
+        date = self.get_date()
+        employee, service = self.get_employee_and_service()
+        return self.day_response(self.calculate_available_times(employee, service, date))
 
     def calculate_available_times(self, employee, service, date):
-        available_times = []
-        
-        employee_duration = employee.duration
-        service_duration = service.duration
-        expected_duration = employee_duration if employee_duration else service_duration
-        
-        work_schedules = EmployeeWorkSchedule.objects.filter(employee=employee, workday=date.strftime('%a').upper()[:3])
-        orders = Order.objects.filter(employee=employee, start_time__date=date, end_time__date=date)
-        
-        for schedule in work_schedules:
-            start_of_day =  timezone.make_aware(datetime.combine(date, schedule.start_time), timezone.get_current_timezone())            
-            end_of_day =  timezone.make_aware(datetime.combine(date, schedule.end_time), timezone.get_current_timezone())
+        return availability.calculate_available_times(employee, service, date)
+
 
-            current_time = start_of_day
+class ServiceAvailableTimeView(AvailableTimeMixin, generics.GenericAPIView):
+    serializer_class = ServiceAvailableTimeSerializer
 
-            while current_time < end_of_day:
-                next_time = current_time + timedelta(seconds=expected_duration.total_seconds())
-                if not orders.filter(start_time__lt=next_time, end_time__gt=current_time).exists():
-                    available_times.append({
-                        "start_time": current_time.strftime('%H:%M'),
-                        "end_time": next_time.strftime('%H:%M')
-                    })
-                current_time = next_time
+    def get(self, request, *args, **kwargs):
+        business_pk = self.kwargs['business_pk']
+        service_pk = self.kwargs['service_pk']
+        date = self.get_date()
+
+        try:
+            service = Service.objects.get(pk=service_pk, business__pk=business_pk)
+        except Service.DoesNotExist:
+            return response.Response({"detail": "Service not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        return available_times
+        return self.day_response(availability.calculate_service_available_times(service, date))
 
 
+class NextAvailableTimeView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = NextAvailableTimeSerializer
+
+    def get(self, request, *args, **kwargs):
+        business_pk = self.kwargs['business_pk']
+        service_pk = self.kwargs['service_pk']
+        employee_pk = self.kwargs.get('employee_pk')
+
+        try:
+            service = Service.objects.get(pk=service_pk, business__pk=business_pk)
+        except Service.DoesNotExist:
+            return response.Response({"detail": "Service not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        if employee_pk is None:
+            employees = list(service.employees.all())
+        else:
+            try:
+                employees = [Employee.objects.get(pk=employee_pk)]
+            except Employee.DoesNotExist:
+                return response.Response({"detail": "Employee not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        next_available = availability.find_next_available(employees, service)
+        if next_available is None:
+            return response.Response(
+                {"detail": f"No available time in the next {availability.NEXT_AVAILABLE_HORIZON_DAYS} days."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = self.get_serializer(next_available)
+        return response.Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class AvailabilityCacheStatsView(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return response.Response(availability_cache.get_stats(), status=status.HTTP_200_OK)
@@ -0,0 +1,186 @@
+"""
+Per-request SQL instrumentation.
+
+``QueryInstrumentationMiddleware`` counts the queries each request runs,
+their total time and how often every SQL shape repeats, and flags N+1
+patterns: the same shape run more than ``QUERY_N_PLUS_ONE_THRESHOLD`` times.
+Results are aggregated per resolved URL name, logged as JSON lines on the
+``equeue.queries`` logger, returned in ``X-Query-*`` headers when DEBUG is on
+and served to staff by ``QueryStatsView``.
+"""
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework import permissions, response, status, views
+
+logger = logging.getLogger('equeue.queries')
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_WHITESPACE = re.compile(r'\s+')
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+# The recorder travels in a context variable rather than a wrapper on one
+# connection object, so queries the async views run through sync_to_async
+# threads are attributed to their request as well.
+_recorder = contextvars.ContextVar('query_recorder', default=None)
+
+
+def fingerprint(sql):
+    # Django passes the SQL with %s placeholders, so only IN lists of
+    # varying length and whitespace differ between runs of the same shape
+    return _IN_LIST.sub('IN (...)', _WHITESPACE.sub(' ', sql.strip()))
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[fingerprint(sql)] += 1
+
+    def repeated(self):
+        return {sql: count for sql, count in self.shapes.items() if count > 1}
+
+    def n_plus_one(self):
+        threshold = getattr(settings, 'QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        return {sql: count for sql, count in self.shapes.items() if count > threshold}
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_execute_wrapper(sender, connection, **kwargs):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def record(url_name, recorder):
+    suspects = recorder.n_plus_one()
+    with _stats_lock:
+        stats = _stats.setdefault(url_name, {
+            'requests': 0,
+            'queries': 0,
+            'db_time_ms': 0.0,
+            'max_queries': 0,
+            'n_plus_one_requests': 0,
+            'n_plus_one_queries': Counter(),
+        })
+        stats['requests'] += 1
+        stats['queries'] += recorder.count
+        stats['db_time_ms'] += recorder.duration * 1000
+        stats['max_queries'] = max(stats['max_queries'], recorder.count)
+        if suspects:
+            stats['n_plus_one_requests'] += 1
+            stats['n_plus_one_queries'].update(suspects)
+    return suspects
+
+
+def get_stats():
+    with _stats_lock:
+        return {
+            url_name: {
+                'requests': stats['requests'],
+                'avg_queries': stats['queries'] / stats['requests'],
+                'max_queries': stats['max_queries'],
+                'avg_db_time_ms': round(stats['db_time_ms'] / stats['requests'], 3),
+                'n_plus_one_requests': stats['n_plus_one_requests'],
+                'n_plus_one_queries': dict(stats['n_plus_one_queries'].most_common(10)),
+            }
+            for url_name, stats in _stats.items()
+        }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_execute_wrapper(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.process(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.process(request, response, recorder)
+
+    def process(self, request, response, recorder):
+        match = request.resolver_match
+        url_name = match.view_name if match else '<unresolved>'
+        suspects = record(url_name, recorder)
+
+        logger.log(logging.WARNING if suspects else logging.INFO, json.dumps({
+            'url_name': url_name,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_time_ms': round(recorder.duration * 1000, 3),
+            'repeated': recorder.repeated(),
+            'n_plus_one': suspects,
+        }))
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = f'{recorder.duration * 1000:.3f}'
+            response['X-Query-Repeated'] = str(sum(count - 1 for count in recorder.repeated().values()))
+            response['X-Query-N-Plus-One'] = str(len(suspects))
+        return response
+
+
+class QueryStatsView(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return response.Response(get_stats(), status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        reset_stats()
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Equeue.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -105,6 +106,57 @@ DATABASES = {
     }
 }
 
+# Slot maps, catalog responses and the auth and availability version tokens all live here.
+# The LocMemCache default is per process: with several workers, a version bump reaches only
+# the worker that made it, so multi-worker deploys must set a shared backend such as Redis
+# or Memcached (manage.py check --deploy warns). MAX_ENTRIES bounds the local backends,
+# which cull a third of their entries whenever they are full.
+CACHES = {
+    "default": {
+        "BACKEND": env.str("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": env.str("CACHE_LOCATION", ""),
+    }
+}
+# Redis and memcached clients reject unknown OPTIONS, so only the local backends get it
+if CACHES["default"]["BACKEND"].endswith((".LocMemCache", ".FileBasedCache", ".DatabaseCache")):
+    CACHES["default"]["OPTIONS"] = {"MAX_ENTRIES": env.int("CACHE_MAX_ENTRIES", 100_000)}
+
+# Seconds a computed free-slot map stays cached (App/availability_cache.py)
+AVAILABILITY_CACHE_TIMEOUT = env.int("AVAILABILITY_CACHE_TIMEOUT", 60 * 60)
+
+# Seconds a rendered catalog response stays cached (App/response_cache.py)
+CATALOG_CACHE_TIMEOUT = env.int("CATALOG_CACHE_TIMEOUT", 60 * 60)
+
+# A request running the same SQL shape more times than this is flagged as N+1
+QUERY_N_PLUS_ONE_THRESHOLD = env.int("QUERY_N_PLUS_ONE_THRESHOLD", 5)
+
+# Minutes a slot hold reserves an employee interval during checkout
+SLOT_HOLD_MINUTES = env.int("SLOT_HOLD_MINUTES", 5)
+
+# Threads rendering thumbnail and medium image variants (App/images.py)
+IMAGE_PIPELINE_WORKERS = env.int("IMAGE_PIPELINE_WORKERS", 2)
+
+# Seconds before a process rebuilds its search index to pick up changes made by other processes
+SEARCH_INDEX_REBUILD_SECONDS = env.int("SEARCH_INDEX_REBUILD_SECONDS", 10 * 60)
+
+# Tokens each process keeps cached, and for how many seconds (Account/authentication.py)
+AUTH_CACHE_SIZE = env.int("AUTH_CACHE_SIZE", 10000)
+AUTH_CACHE_TIMEOUT = env.int("AUTH_CACHE_TIMEOUT", 5 * 60)
+
+# Gateway class the SMS outbox sends through (Account/sms.py), required; FileGateway writes to SMS_FILE_PATH
+SMS_GATEWAY = env.str("SMS_GATEWAY", None)
+SMS_FILE_PATH = env.str("SMS_FILE_PATH", None)
+
+# Send queued SMS from a thread of the web process; off by default, run manage.py send_sms instead
+SMS_SENDER_THREAD = env.bool("SMS_SENDER_THREAD", False)
+
+# Messages per gateway call, and attempts before a message is given up (Account/outbox.py)
+SMS_BATCH_SIZE = env.int("SMS_BATCH_SIZE", 50)
+SMS_MAX_ATTEMPTS = env.int("SMS_MAX_ATTEMPTS", 5)
+
+# Delay before the first retry, doubled after every failed attempt
+SMS_RETRY_SECONDS = env.int("SMS_RETRY_SECONDS", 30)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -160,7 +212,7 @@ JQUERY_URL = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'Account.authentication.CachedTokenAuthentication',
     ]
 }
 
@@ -0,0 +1,88 @@
+"""
+Dirty-field tracking for models.
+
+``DirtyFieldsMixin`` snapshots the concrete field values a row was loaded
+with in ``from_db`` and again after every save and ``refresh_from_db``. Signal receivers read the
+previous state from the snapshot instead of querying the row again, and
+saves can pass ``update_fields=instance.get_changed_fields()`` to write
+only the columns that changed.
+"""
+import copy
+
+from django.db.models.fields.files import FieldFile
+
+
+def _normalize(value):
+    # A FieldFile is changed in place by FieldFile.save, keep its name instead
+    if isinstance(value, FieldFile):
+        return value.name
+    return value
+
+
+class DirtyFieldsMixin:
+    """Mix into a model before ``models.Model``."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            attname: _normalize(value) for attname, value in zip(field_names, values)
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot(fields)
+
+    def _snapshot(self, field_names=None):
+        """Take the current values of ``field_names``, or of all loaded fields, as stored."""
+        fields = self._meta.concrete_fields
+        if field_names is not None:
+            field_names = set(field_names)
+            fields = [field for field in fields if field.name in field_names or field.attname in field_names]
+        loaded_values = getattr(self, '_loaded_values', {})
+        loaded_values.update(
+            (field.attname, _normalize(self.__dict__[field.attname]))
+            for field in fields
+            if field.attname in self.__dict__
+        )
+        self._loaded_values = loaded_values
+
+    def is_tracked(self):
+        """Whether there is a snapshot, i.e. the row was loaded or saved by this instance."""
+        return hasattr(self, '_loaded_values')
+
+    def get_changed_fields(self):
+        """
+        Names of the loaded fields whose value differs from the snapshot.
+        Without a snapshot every concrete field counts as changed.
+        """
+        if not self.is_tracked():
+            return [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in self._loaded_values
+            and field.attname in self.__dict__
+            and _normalize(self.__dict__[field.attname]) != self._loaded_values[field.attname]
+        ]
+
+    def has_changed(self, field_name):
+        return self._meta.get_field(field_name).name in self.get_changed_fields()
+
+    def get_loaded_instance(self):
+        """
+        A copy of this instance holding the snapshot values, standing in for
+        the row as stored. ``None`` without a snapshot.
+        """
+        if not self.is_tracked():
+            return None
+        loaded = copy.copy(self)
+        for attname, value in self._loaded_values.items():
+            loaded.__dict__[attname] = value
+        loaded._state.fields_cache = {}
+        return loaded
@@ -19,11 +19,13 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
+from .instrumentation import QueryStatsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('app/', include('App.urls')),
     path('account/', include('Account.urls')),
+    path('debug/queries/', QueryStatsView.as_view(), name='query-stats'),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
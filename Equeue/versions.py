@@ -0,0 +1,35 @@
+"""
+Version tokens for cache invalidation.
+
+Cached values are keyed by, or stored with, the current version tokens of
+everything they depend on, so replacing a token makes every value taken
+under the old one unreachable. Tokens are random instead of counters: an
+evicted token can never bring an old value back to life.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get_versions(keys):
+    """``{key: token}`` for the version ``keys``, creating the missing tokens."""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # add() never overwrites a token bumped meanwhile
+            version = uuid.uuid4().hex
+            versions[key] = version if cache.add(key, version, None) else cache.get(key)
+    return versions
+
+
+def get_version(key):
+    return get_versions([key])[key]
+
+
+def bump(key):
+    cache.set(key, uuid.uuid4().hex, None)
+    # Bump again once the transaction commits, so values computed by other
+    # requests from the not yet committed state do not outlive it.
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))